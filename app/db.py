@@ -1,14 +1,214 @@
+# app/db.py
+"""
+Shared MongoDB and Redis clients.
 
+One Resources registry per process owns both connection pools: main.lifespan
+opens it on startup and closes it on shutdown, and everything else gets the
+clients through app.dependencies.get_database / get_redis. Pool sizes,
+timeouts and keepalive come from settings, and every Redis call goes through
+the circuit breaker in app.utils.redis_breaker. Opening only builds the clients;
+neither driver connects before the first command.
+
+Pool metrics (stats()) cover connections open / in use and how long callers
+waited to check a connection out of each pool.
+"""
+
+import asyncio
+import threading
+import time
+
+import redis.asyncio as aioredis
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.utils.compute import _Timings
 from app.utils.config import settings
-import redis.asyncio as aioredis# --- Redis setup ---
-redis_client = aioredis.from_url(
-    settings.REDIS_URL,
-    encoding="utf-8",
-    decode_responses=True
-)
+from app.utils.redis_breaker import BreakerRedis, redis_breaker
+
+
+class _MongoPoolListener(monitoring.ConnectionPoolListener):
+    """CMAP events are published on driver threads, hence the lock and thread-local start times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.open = 0
+        self.checked_out = 0
+        self.failed_checkouts = 0
+        self.wait = _Timings(settings.POOL_METRICS_WINDOW)
+
+    def _waited(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            self.wait.add(time.perf_counter() - started)
+            self._local.started = None
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self._waited()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failed_checkouts += 1
+            self._waited()
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class _TimedRedisPool(aioredis.ConnectionPool):
+    """
+    Bounded pool where callers wait up to REDIS_POOL_TIMEOUT for a free
+    connection instead of failing, with checkout timing. The wait happens
+    before the connection is taken, so a failed connect (Redis down) releases
+    its slot right away; redis-py's BlockingConnectionPool holds its lock
+    while connecting and stalls on release in that case.
+    """
+
+    def __init__(self, *args, timeout: float = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+        self._freed = asyncio.Condition()
+        self.wait = _Timings(settings.POOL_METRICS_WINDOW)
+        self.failed_checkouts = 0
+
+    async def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        try:
+            if not self.can_get_connection():
+                try:
+                    async with self._freed:
+                        await asyncio.wait_for(self._freed.wait_for(self.can_get_connection), self.timeout)
+                except asyncio.TimeoutError:
+                    raise aioredis.ConnectionError("No connection available.") from None
+            # No await between the check above and taking the slot
+            return await super().get_connection(command_name, *keys, **options)
+        except aioredis.ConnectionError:
+            self.failed_checkouts += 1
+            raise
+        finally:
+            self.wait.add(time.perf_counter() - started)
+
+    async def release(self, connection):
+        await super().release(connection)
+        async with self._freed:
+            self._freed.notify()
+
+
+class Resources:
+    def __init__(self):
+        self.mongo_client = None
+        self.db = None
+        self.redis = None
+        self._mongo_pool = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.mongo_client is not None
+
+    def open(self):
+        if self.is_open:
+            return
+        self._mongo_pool = _MongoPoolListener()
+        self.mongo_client = AsyncIOMotorClient(
+            settings.MONGO_URI,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS,
+            event_listeners=[self._mongo_pool],
+        )
+        self.db = self.mongo_client[settings.MONGO_DB]
+        pool = _TimedRedisPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            decode_responses=True,
+        )
+        self.redis = BreakerRedis.from_pool(pool)
+        self.redis.breaker = redis_breaker
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+        self.mongo_client = self.db = self.redis = self._mongo_pool = None
+
+    async def probe(self, timeout: float) -> dict:
+        """Ping Mongo and Redis concurrently, each bounded by `timeout` seconds."""
+        self.open()
+
+        async def check(ping):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(ping(), timeout)
+            except Exception as e:
+                return {"ok": False, "error": str(e) or type(e).__name__}
+            return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+        mongo, redis = await asyncio.gather(check(lambda: self.db.command("ping")), check(self.redis.ping))
+        return {"mongo": mongo, "redis": redis}
 
-client = AsyncIOMotorClient(settings.MONGO_URI)
-db = client[settings.MONGO_DB]
+    def stats(self) -> dict:
+        if not self.is_open:
+            return {"open": False}
+        mongo, pool = self._mongo_pool, self.redis.connection_pool
+        return {
+            "open": True,
+            "mongo": {
+                "max_pool_size": settings.MONGO_MAX_POOL_SIZE,
+                "open_connections": mongo.open,
+                "in_use": mongo.checked_out,
+                "utilisation": round(mongo.checked_out / settings.MONGO_MAX_POOL_SIZE, 4),
+                "failed_checkouts": mongo.failed_checkouts,
+                "checkout_wait": mongo.wait.summary(),
+            },
+            "redis": {
+                "max_connections": pool.max_connections,
+                "open_connections": len(pool._available_connections) + len(pool._in_use_connections),
+                "in_use": len(pool._in_use_connections),
+                "utilisation": round(len(pool._in_use_connections) / pool.max_connections, 4),
+                "failed_checkouts": pool.failed_checkouts,
+                "checkout_wait": pool.wait.summary(),
+            },
+        }
 
 
+# One registry per worker process, opened in main.lifespan
+resources = Resources()
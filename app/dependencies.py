@@ -4,31 +4,23 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 import redis.asyncio as aioredis
-from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.utils.config import settings  # ✅ keep settings source consistent
+from app.utils.cache_stats import cache_stats
+from app.db import resources
 
-# Create MongoDB client
-mongo_client = AsyncIOMotorClient(settings.MONGO_URI)
-db = mongo_client[settings.MONGO_DB]
-
+# Clients come from the shared registry in app.db, opened in main.lifespan
+# (and on first use for scripts that run without the app)
 async def get_database():
 
-    return db
-
+    resources.open()
+    return resources.db
 
-# Create Redis client (lazy connection)
-redis_client: aioredis.Redis | None = None
 
 async def get_redis() -> aioredis.Redis:
 
-    global redis_client
-    if redis_client is None:
-        redis_client = aioredis.from_url(
-            f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
-            decode_responses=True  # ✅ returns str, don't .decode() later
-        )
-    return redis_client
+    resources.open()
+    return resources.redis
 
 async def ping_redis(redis_client: aioredis.Redis = Depends(get_redis)):
 
@@ -49,6 +41,7 @@ async def cache_user_session(user: dict, redis_client: aioredis.Redis):
         settings.SESSION_EXPIRE_SECONDS,
         str(user["_id"])
     )
+    cache_stats.record_fill(key)
 
 # ============================================================
 # ------------------ AUTH & SECURITY -------------------------
@@ -80,7 +73,11 @@ def create_refresh_token(data: dict):
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_database)):
+    return await user_from_token(token, db)
+
 
+async def user_from_token(token: str, db):
+    """Resolve a bearer token to its user document; raises 401/404 like get_current_user."""
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
         username: str = payload.get("sub")
@@ -102,10 +99,4 @@ async def close_connections():
     Gracefully close MongoDB + Redis connections.
     Should be called on FastAPI shutdown event.
     """
-    global redis_client
-    # Close MongoDB
-    mongo_client.close()
-    # Close Redis if connected
-    if redis_client:
-        await redis_client.close()
-        redis_client = None
+    await resources.close()
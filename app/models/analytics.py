@@ -1,10 +1,22 @@
 from pydantic import BaseModel
-from typing import List, Dict
-from datetime import datetime
+from typing import Any, List, Dict, Literal, Optional
+from datetime import datetime, date
+
+class LessonPerformance(BaseModel):
+    lesson_id: str
+    completions: int = 0
+    avg_score: float = 0.0
+    avg_time_spent: float = 0.0
 
 class CoursePerformanceResponse(BaseModel):
     course_id: str
     avg_score: float
+    total_enrollments: int = 0
+    total_completions: int = 0
+    avg_time_per_lesson: float = 0.0
+    lessons: List[LessonPerformance] = []
+    most_difficult_lessons: List[str] = []
+    completion_by_module: Dict[str, float] = {}
     last_cached: datetime
 
 class StudentLearningPatternResponse(BaseModel):
@@ -12,6 +24,15 @@ class StudentLearningPatternResponse(BaseModel):
     lessons_completed: int
     avg_quiz_score: float
     engagement_level: str
+    engagement_score: float = 0.0
+    courses_enrolled: int = 0
+    total_time_spent: int = 0
+    avg_session_duration: float = 0.0
+    active_days_last_30: int = 0
+    lessons_per_active_day: float = 0.0
+    learning_velocity: str = "slow"
+    strong_subjects: List[str] = []
+    areas_for_improvement: List[str] = []
     last_cached: datetime
 
 class PlatformOverviewResponse(BaseModel):
@@ -19,4 +40,103 @@ class PlatformOverviewResponse(BaseModel):
     total_courses: int
     avg_completion_rate: float
     most_popular_courses: List[Dict]
+    monthly_active_users: Optional[int] = None  # None while Redis is unavailable
+    last_cached: datetime
+
+class DailyRollupRow(BaseModel):
+    date: date
+    completions: int
+    active_learners: int
+    avg_score: float
+    time_spent: int
+
+class RollupTotals(BaseModel):
+    completions: int
+    learner_days: int
+    avg_score: float
+    time_spent: int
+    distinct_active_learners: Optional[int] = None
+
+class CourseDailyAnalyticsResponse(BaseModel):
+    course_id: str
+    start: date
+    end: date
+    totals: RollupTotals
+    daily: List[DailyRollupRow]
+
+class PlatformDailyAnalyticsResponse(BaseModel):
+    start: date
+    end: date
+    totals: RollupTotals
+    daily: List[DailyRollupRow]
+
+class HistogramBin(BaseModel):
+    low: int
+    high: int
+    count: int
+
+class ScoreDistributionResponse(BaseModel):
+    course_id: str
+    lesson_id: Optional[str] = None
+    count: int
+    mean: float
+    percentiles: Dict[str, Optional[int]]
+    histogram: List[HistogramBin]
+    error_bound: int
+
+class ActiveLearnersResponse(BaseModel):
+    course_id: Optional[str] = None
+    date: date
+    dau: int
+    wau: int
+    mau: int
+
+class LessonDifficulty(BaseModel):
+    lesson_id: str
+    module_id: Optional[str] = None
+    difficulty: float
+    learners: int
+    avg_score: float
+    retry_rate: float
+    avg_time_spent: float
+    drop_off_rate: float
+
+class CourseDifficultyResponse(BaseModel):
+    course_id: str
+    most_difficult_lessons: List[LessonDifficulty]
+    completion_by_module: Dict[str, float]
+
+class FunnelStage(BaseModel):
+    module_id: str
+    position: int
+    started: int
+    completed: int
+    completion_rate: float
+    drop_off_rate: float
+
+class CourseFunnelResponse(BaseModel):
+    course_id: str
+    learners: int
+    stages: List[FunnelStage]
     last_cached: datetime
+
+class ReportRequest(BaseModel):
+    type: Literal["course_progress", "platform_daily"]
+    course_id: Optional[str] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+class ReportJobResponse(BaseModel):
+    job_id: str
+    type: str
+    params: Dict[str, Any]
+    status: str
+    progress: float
+    created_at: datetime
+    updated_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    deduplicated: bool = False
@@ -49,3 +49,8 @@ class CourseUpdate(BaseModel):
 
 class CourseOut(CourseBase):
     id: str
+
+
+class CourseBatchOut(BaseModel):
+    courses: List[CourseOut]
+    missing: List[str] = []
@@ -1,16 +1,63 @@
 # app/models/progress.py
 
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+
+from app.utils.config import settings
+
+# Lesson ids become field names in course_stats (lessons.<id>.<counter>)
+LESSON_ID_PATTERN = r"^[^.$][^.]*$"
+
+class QuizScoreSummary(BaseModel):
+    count: int = 0
+    sum: int = 0
+    min: Optional[int] = None
+    max: Optional[int] = None
+    last: Optional[int] = None
+    best: Optional[int] = None
 
 class LessonProgress(BaseModel):
     lesson_id: str
     completed: bool = False
     time_spent_seconds: int = 0
-    quiz_scores: Optional[List[int]] = []
+    quiz_scores: Optional[List[int]] = []  # most recent attempts only (QUIZ_SCORE_HISTORY_SIZE)
+    quiz_summary: Optional[QuizScoreSummary] = None
 
 class CourseProgress(BaseModel):
     course_id: str
     lessons: List[LessonProgress] = []
     completion_percentage: float = 0.0
+
+# ----------------- Offline Sync -----------------
+class ProgressEvent(BaseModel):
+    event_id: str = Field(..., description="Client-generated idempotency id")
+    course_id: str
+    lesson_id: str = Field(..., pattern=LESSON_ID_PATTERN)
+    time_spent: int = Field(0, ge=0)
+    quiz_score: int = Field(0, ge=0, le=settings.QUIZ_SCORE_MAX)
+    client_timestamp: datetime
+
+    @field_validator("client_timestamp")
+    @classmethod
+    def naive_utc(cls, value: datetime) -> datetime:
+        # Stored and bucketed by day as naive UTC, like every other timestamp
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        now = datetime.utcnow()
+        if value > now + timedelta(seconds=settings.PROGRESS_SYNC_MAX_CLOCK_SKEW):
+            raise ValueError("client_timestamp is in the future")
+        # Older events could outlive their dedupe entry and be applied twice
+        if value < now - timedelta(seconds=settings.PROGRESS_SYNC_DEDUP_TTL):
+            raise ValueError("client_timestamp is older than the sync window")
+        return value
+
+class ProgressSyncRequest(BaseModel):
+    user_id: str
+    events: List[ProgressEvent] = Field(..., max_length=500)
+
+class ProgressSyncResponse(BaseModel):
+    applied: int
+    duplicates: int
+    courses_updated: List[str]
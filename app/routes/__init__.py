@@ -11,3 +11,4 @@ from . import course
 from . import progress
 from . import analytics
 from . import cache
+from . import live
@@ -1,19 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from datetime import date
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pymongo.database import Database
 import redis.asyncio as redis
 
-from app.dependencies import get_database, get_redis
+from app.dependencies import get_database, get_redis, get_current_user
 from app.services.analytics_service import AnalyticsService
-from app.models.analytics import CoursePerformanceResponse, StudentLearningPatternResponse, PlatformOverviewResponse
+from app.services.activity_service import ActivityService
+from app.services.cache_warmer import record_course_traffic
+from app.utils.config import settings
+from app.utils.compute import compute_executor
+from app.models.analytics import (
+    CoursePerformanceResponse,
+    StudentLearningPatternResponse,
+    PlatformOverviewResponse,
+    CourseDailyAnalyticsResponse,
+    PlatformDailyAnalyticsResponse,
+    ScoreDistributionResponse,
+    ActiveLearnersResponse,
+    CourseDifficultyResponse,
+    CourseFunnelResponse,
+    ReportRequest,
+    ReportJobResponse,
+)
+from app.services.rollup_service import RollupService
+from app.services.score_distribution_service import ScoreDistributionService
+from app.services.lesson_difficulty_service import LessonDifficultyService
+from app.services.module_funnel_service import ModuleFunnelService
+from app.services.report_service import ReportService
+from app.services.progress_snapshot import ProgressSnapshotExporter, ProgressSnapshot, course_lesson_stats
 
 router = APIRouter()
 
+
+def _check_range(start: date, end: date):
+    if end < start or (end - start).days >= settings.ACTIVITY_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+
+
 # Get course performance (cached 15min)
 @router.get("/courses/{course_id}/performance", response_model=CoursePerformanceResponse)
 async def course_performance(course_id: str, db: Database = Depends(get_database), redis_client: redis.Redis = Depends(get_redis)):
     service = AnalyticsService(db, redis_client)
+    await record_course_traffic(redis_client, course_id)
     return await service.course_performance(course_id)
 
+# Most popular courses by enrollment (cached 1 hour, kept warm in the background)
+@router.get("/courses/popular")
+async def popular_courses(db: Database = Depends(get_database), redis_client: redis.Redis = Depends(get_redis)):
+    service = AnalyticsService(db, redis_client)
+    return await service.popular_courses()
+
 # Get student learning patterns (cached 30min)
 @router.get("/students/{student_id}/learning-patterns", response_model=StudentLearningPatternResponse)
 async def learning_patterns(student_id: str, db: Database = Depends(get_database), redis_client: redis.Redis = Depends(get_redis)):
@@ -26,3 +64,204 @@ async def platform_overview(db: Database = Depends(get_database), redis_client:
     # Add admin check here if you implement JWT roles
     service = AnalyticsService(db, redis_client)
     return await service.platform_overview()
+
+# Platform daily active learners over a date range (Redis bitmaps)
+@router.get("/platform/daily-actives")
+async def daily_actives(start: date = Query(...), end: date = Query(...), redis_client: redis.Redis = Depends(get_redis)):
+    _check_range(start, end)
+    return await ActivityService(redis_client).daily_actives(start, end)
+
+
+# Course completions / learners / scores per day, read from daily rollups
+@router.get("/courses/{course_id}/daily", response_model=CourseDailyAnalyticsResponse)
+async def course_daily(
+    course_id: str,
+    start: date = Query(...),
+    end: date = Query(...),
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    _check_range(start, end)
+    return await RollupService(db, redis_client).course_range(course_id, start, end)
+
+# Platform-wide daily metrics, read from daily rollups
+@router.get("/platform/daily", response_model=PlatformDailyAnalyticsResponse)
+async def platform_daily(
+    start: date = Query(...),
+    end: date = Query(...),
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    _check_range(start, end)
+    daily_actives = await ActivityService(redis_client).daily_actives(start, end)
+    return await RollupService(db, redis_client).platform_range(start, end, daily_actives)
+
+# Quiz-score percentiles and histogram for a course or one of its lessons
+@router.get("/courses/{course_id}/score-distribution", response_model=ScoreDistributionResponse)
+async def score_distribution(
+    course_id: str,
+    lesson_id: str | None = Query(None),
+    percentiles: str = Query("50,90,99"),
+    bins: int = Query(10, ge=1, le=101),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    try:
+        wanted = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers")
+    if not wanted or any(p <= 0 or p > 100 for p in wanted):
+        raise HTTPException(status_code=400, detail="percentiles must be in (0, 100]")
+    service = ScoreDistributionService(redis_client)
+    return await service.distribution(course_id, lesson_id, wanted, bins)
+
+# Approximate DAU / WAU / MAU (HyperLogLog), platform-wide or per course
+@router.get("/platform/active-learners", response_model=ActiveLearnersResponse)
+async def platform_active_learners(redis_client: redis.Redis = Depends(get_redis)):
+    return await ActivityService(redis_client).active_learner_counts()
+
+@router.get("/courses/{course_id}/active-learners", response_model=ActiveLearnersResponse)
+async def course_active_learners(course_id: str, redis_client: redis.Redis = Depends(get_redis)):
+    return await ActivityService(redis_client).active_learner_counts(course_id)
+
+
+# Hardest lessons and per-module completion, read from the incrementally maintained ranking
+@router.get("/courses/{course_id}/difficulty", response_model=CourseDifficultyResponse)
+async def course_difficulty(
+    course_id: str,
+    limit: int = Query(settings.LESSON_DIFFICULTY_TOP_K, ge=1, le=100),
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    return await LessonDifficultyService(db, redis_client).summary(course_id, limit)
+
+# Learners starting and finishing each module, in course order
+@router.get("/courses/{course_id}/funnel", response_model=CourseFunnelResponse)
+async def course_funnel(
+    course_id: str,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    return await ModuleFunnelService(db, redis_client).funnel(course_id)
+
+
+# ---------- Columnar progress snapshots ----------
+SNAPSHOT_LOCK_KEY = "progress_snapshot:lock"
+
+
+async def _export_snapshot(db, redis_client):
+    try:
+        await ProgressSnapshotExporter(db).export()
+    finally:
+        await redis_client.delete(SNAPSHOT_LOCK_KEY)
+
+
+# Export a new snapshot in the background (admin only)
+@router.post("/snapshots/progress", status_code=202)
+async def export_progress_snapshot(
+    background_tasks: BackgroundTasks,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis),
+    user=Depends(get_current_user)
+):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can export snapshots")
+    if not await redis_client.set(SNAPSHOT_LOCK_KEY, "1", nx=True, ex=3600):
+        raise HTTPException(status_code=409, detail="A snapshot export is already running")
+    background_tasks.add_task(_export_snapshot, db, redis_client)
+    return {"status": "started"}
+
+# Manifest of the snapshot currently served (admin only)
+@router.get("/snapshots/progress")
+async def current_progress_snapshot(user=Depends(get_current_user)):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can read snapshots")
+    try:
+        return ProgressSnapshot.open().manifest
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Per-lesson stats for a course, vectorized over the memory-mapped snapshot (admin only)
+@router.get("/snapshots/courses/{course_id}/lessons")
+async def snapshot_course_lessons(course_id: str, user=Depends(get_current_user)):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can read snapshots")
+    try:
+        snapshot = ProgressSnapshot.open()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        lessons = await compute_executor.run(course_lesson_stats, snapshot.path, course_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Snapshot computation timed out")
+    return {"course_id": course_id, "snapshot_version": snapshot.manifest["version"], "lessons": lessons}
+
+
+# ---------- Report jobs ----------
+def _require_admin(user):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can run reports")
+
+
+# Queue a report (identical requests share one job)
+@router.post("/reports", response_model=ReportJobResponse, status_code=202)
+async def submit_report(
+    request: ReportRequest,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis),
+    user=Depends(get_current_user)
+):
+    _require_admin(user)
+    service = ReportService(db, redis_client)
+    try:
+        params = service.normalize_params(request.type, request.course_id, request.start, request.end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await service.submit(request.type, params, requested_by=str(user.get("_id", "")))
+
+# Poll job status and progress
+@router.get("/reports/{job_id}", response_model=ReportJobResponse)
+async def report_status(
+    job_id: str,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis),
+    user=Depends(get_current_user)
+):
+    _require_admin(user)
+    job = await ReportService(db, redis_client).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+# Stream a finished report from GridFS
+@router.get("/reports/{job_id}/download")
+async def download_report(
+    job_id: str,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis),
+    user=Depends(get_current_user)
+):
+    _require_admin(user)
+    service = ReportService(db, redis_client)
+    job = await service.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Report is {job['status']}")
+    grid_out = await service.open_result(job)
+    return StreamingResponse(
+        service.iter_result(grid_out),
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": f'attachment; filename="{job["filename"]}"',
+            "Content-Length": str(job["size"]),
+        },
+    )
+
+
+# ---------- Compute pool ----------
+# Queue wait and compute time of the analytics process pool (admin only)
+@router.get("/compute/stats")
+async def compute_stats(user=Depends(get_current_user)):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can see compute stats")
+    return compute_executor.stats()
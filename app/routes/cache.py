@@ -2,14 +2,19 @@
 Cache management endpoints for E-Learning API
 
 Endpoints:
-- GET /cache/stats : Show Redis stats (admin only)
-- DELETE /cache/flush : Clear Redis cache (admin only)
+- GET /cache/stats : Show Redis stats and per-namespace cache stats (admin only)
+- DELETE /cache/stats : Reset per-namespace cache stats (admin only)
+- DELETE /cache/flush : Flush cache namespaces or a key pattern in the background (admin only)
+- GET /cache/flush/{job_id} : Flush progress (admin only)
 """
 
 from app.dependencies import get_current_user
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from app.dependencies import get_redis  # instead of app.dependencies
 import redis.asyncio as redis
+from app.utils.cache_stats import cache_stats as namespace_stats
+from app.services.cache_flush_service import CacheFlushService
 
 router = APIRouter()
 
@@ -24,21 +29,72 @@ async def cache_stats(redis=Depends(get_redis), user=Depends(get_current_user)):
     info = await redis.info()
     dbsize = await redis.dbsize()
 
+    # Include this worker's not-yet-flushed counts
+    await namespace_stats.flush(redis)
+    namespaces = await namespace_stats.read(redis)
+    memory = await namespace_stats.memory_by_namespace(redis)
+    for ns in set(namespaces) | set(memory):
+        namespaces.setdefault(ns, {})["memory"] = memory.get(ns)
+
     return {
         "connected": True,
         "dbsize": dbsize,
-        "used_memory_human": info.get("used_memory_human")
+        "used_memory_human": info.get("used_memory_human"),
+        "evicted_keys": info.get("evicted_keys"),
+        "expired_keys": info.get("expired_keys"),
+        "keyspace_hits": info.get("keyspace_hits"),
+        "keyspace_misses": info.get("keyspace_misses"),
+        "namespaces": namespaces,
     }
 
 
-@router.delete("/flush")
-async def flush_cache(redis=Depends(get_redis), user=Depends(get_current_user)):
+@router.delete("/stats")
+async def reset_cache_stats(redis=Depends(get_redis), user=Depends(get_current_user)):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can reset cache stats")
+
+    await namespace_stats.reset(redis)
+    return {"status": "Cache stats reset"}
+
+
+@router.delete("/flush", status_code=202)
+async def flush_cache(
+    background_tasks: BackgroundTasks,
+    namespace: Optional[List[str]] = Query(None),
+    pattern: Optional[str] = Query(None),
+    dry_run: bool = Query(False),
+    redis=Depends(get_redis),
+    user=Depends(get_current_user)
+):
     """
-    Clear all keys in Redis database.
+    Flush cache namespaces (all cache namespaces by default), optionally
+    narrowed to keys matching a pattern. Only cache namespaces are ever
+    deleted: sessions, tokens and Redis-only data (heartbeats, sync markers,
+    activity bitmaps, counters) are never selected.
+    Runs in the background; dry_run only counts matching keys.
     Only accessible to admin users.
     """
     if user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admin can flush cache")
 
-    await redis.flushdb()  # <-- important for async redis
-    return {"status": "Cache cleared"}
+    service = CacheFlushService(redis)
+    try:
+        service.validate(namespace, pattern)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = await service.start(namespace, pattern, dry_run, requested_by=str(user.get("_id", "")))
+    if job is None:
+        raise HTTPException(status_code=409, detail="A cache flush is already running")
+    background_tasks.add_task(service.run, job["job_id"])
+    return job
+
+
+@router.get("/flush/{job_id}")
+async def flush_status(job_id: str, redis=Depends(get_redis), user=Depends(get_current_user)):
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can see cache flushes")
+
+    job = await CacheFlushService(redis).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Flush job not found")
+    return job
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from fastapi.encoders import jsonable_encoder
 from typing import List
 import shutil, os
 
 from bson import ObjectId
-from app.dependencies import get_database
-from app.db import db
-from app.models.course import CourseCreate, CourseUpdate, CourseOut
+from app.dependencies import get_database, get_redis
+from app.models.course import CourseCreate, CourseUpdate, CourseOut, CourseBatchOut
+from app.services.course_service import CourseService
+from app.utils.config import settings
 
 router = APIRouter()
 UPLOAD_DIR = "uploads"
@@ -16,12 +17,13 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 @router.post("/", response_model=CourseOut, summary="Create Course (JSON only)")
 async def create_course(
     course_data: CourseCreate,  # JSON body
-    db=Depends(get_database)
+    db=Depends(get_database),
+    redis_client=Depends(get_redis)
 ):
     try:
         course_dict = jsonable_encoder(course_data)
-        result = await db["courses"].insert_one(course_dict)
-        return CourseOut(id=str(result.inserted_id), **course_dict)
+        course_id = await CourseService(db, redis_client).create_course(course_dict)
+        return CourseOut(id=course_id, **course_dict)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -63,6 +65,27 @@ async def get_courses(db=Depends(get_database)):
         items.append(CourseOut(**normalized))
     return items
 
+# ------------------- Get Courses by IDs -------------------
+# Declared before /{course_id} so "batch" isn't taken for an id
+@router.get("/batch", response_model=CourseBatchOut, summary="Get Courses by IDs")
+async def get_courses_batch(
+    ids: List[str] = Query(..., description="Course ids, repeated or comma-separated"),
+    db=Depends(get_database),
+    redis_client=Depends(get_redis)
+):
+    course_ids = list(dict.fromkeys(i.strip() for value in ids for i in value.split(",") if i.strip()))
+    if len(course_ids) > settings.COURSE_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.COURSE_BATCH_MAX_IDS} ids per request")
+    invalid = [i for i in course_ids if not ObjectId.is_valid(i)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid course ID: {', '.join(invalid)}")
+
+    found = await CourseService(db, redis_client).get_courses(course_ids)
+    return CourseBatchOut(
+        courses=[CourseOut(**_normalize_course(found[i])) for i in course_ids if found[i]],
+        missing=[i for i in course_ids if not found[i]],
+    )
+
 # ------------------- Get Course by ID -------------------
 @router.get("/{course_id}", response_model=CourseOut, summary="Get Course by ID")
 async def get_course(course_id: str, db=Depends(get_database)):
@@ -80,10 +103,13 @@ async def get_course(course_id: str, db=Depends(get_database)):
 
 
 # ------------------- Update Course -------------------
-courses_collection = db["courses"]
-
 @router.put("/courses/{course_id}")
-async def update_course(course_id: str, course: CourseUpdate):
+async def update_course(
+    course_id: str,
+    course: CourseUpdate,
+    db=Depends(get_database),
+    redis_client=Depends(get_redis)
+):
     # Convert ObjectId
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status_code=400, detail="Invalid course ID")
@@ -94,12 +120,8 @@ async def update_course(course_id: str, course: CourseUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields provided for update")
 
-    result = await courses_collection.update_one(
-        {"_id": ObjectId(course_id)},
-        {"$set": update_data}
-    )
-
-    if result.matched_count == 0:
+    # Through the service so course:{id}, the outline and the lists are invalidated
+    if await CourseService(db, redis_client).update_course(course_id, update_data) is None:
         raise HTTPException(status_code=404, detail="Course not found")
 
     return {"message": "Course updated successfully", "updated_fields": update_data}
@@ -107,16 +129,14 @@ async def update_course(course_id: str, course: CourseUpdate):
 
 # ------------------- Delete Course -------------------
 @router.delete("/{course_id}", summary="Delete Course")
-async def delete_course(course_id: str, db=Depends(get_database)):
-    try:
-        oid = ObjectId(course_id)
-    except:
+async def delete_course(course_id: str, db=Depends(get_database), redis_client=Depends(get_redis)):
+    if not ObjectId.is_valid(course_id):
         raise HTTPException(status_code=400, detail="Invalid course ID")
 
-    result = await db["courses"].delete_one({"_id": oid})
-    if result.deleted_count == 0:
+    deleted = await CourseService(db, redis_client).delete_course(course_id)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    return {"message": "Course deleted successfully"}
+    return deleted
 
 
 # ------------------- Upload File to a Specific Lesson -------------------
@@ -130,10 +150,9 @@ async def upload_lesson_file(
     lesson_id: str,
     file: UploadFile = File(...),
     db=Depends(get_database),
+    redis_client=Depends(get_redis),
 ):
-    try:
-        oid = ObjectId(course_id)
-    except:
+    if not ObjectId.is_valid(course_id):
         raise HTTPException(status_code=400, detail="Invalid course ID")
 
     path = os.path.join(UPLOAD_DIR, file.filename)
@@ -142,13 +161,8 @@ async def upload_lesson_file(
 
     file_url = path
 
-    result = await db["courses"].update_one(
-        {"_id": oid, "modules.id": module_id, "modules.lessons.id": lesson_id},
-        {"$set": {"modules.$[mod].lessons.$[les].file_url": file_url}},
-        array_filters=[{"mod.id": module_id}, {"les.id": lesson_id}]
-    )
-
-    if result.matched_count == 0:
+    uploaded = await CourseService(db, redis_client).set_lesson_file(course_id, module_id, lesson_id, file_url)
+    if uploaded is None:
         raise HTTPException(status_code=404, detail="Course/module/lesson not found")
 
-    return {"message": "File uploaded successfully", "file_url": file_url}
+    return uploaded
@@ -0,0 +1,153 @@
+"""
+Live dashboard push for E-Learning API
+
+Endpoints:
+- GET /live/events?topics=user:{id},course:{id} : Server-Sent Events stream
+- WS  /live/ws?topics=...                       : WebSocket stream, accepts
+  {"subscribe": [...]} / {"unsubscribe": [...]} messages to change topics
+
+Both need a bearer token (Authorization header, or `token` query parameter
+for clients such as EventSource that can't set headers). Users may follow
+their own user topic and the courses they are enrolled in or teach; admins
+may follow anything.
+"""
+
+import asyncio
+import json
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+import redis.asyncio as redis
+
+from app.dependencies import get_database, get_redis, user_from_token
+from app.services.live_service import TOPIC_PATTERN, live_hub
+from app.utils.config import settings
+
+router = APIRouter()
+
+
+def _parse_topics(raw) -> list:
+    topics = [t.strip() for t in raw if t and t.strip()]
+    if len(topics) > settings.LIVE_MAX_TOPICS:
+        raise ValueError(f"At most {settings.LIVE_MAX_TOPICS} topics per connection")
+    for topic in topics:
+        if not TOPIC_PATTERN.match(topic):
+            raise ValueError(f"Invalid topic: {topic}")
+    return topics
+
+
+def _bearer_token(headers, token: str = None):
+    scheme, _, credentials = headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return token
+
+
+async def _check_topics(db, user: dict, topics):
+    """Raises PermissionError for a topic the user may not follow."""
+    if user["role"] == "admin":
+        return
+    user_id = str(user["_id"])
+    for topic in topics:
+        kind, target = topic.split(":", 1)
+        if kind == "user":
+            allowed = target == user_id
+        else:
+            allowed = await db.progress.find_one({"user_id": user_id, "course_id": target}, {"_id": 1}) is not None
+            if not allowed and user["role"] == "instructor" and ObjectId.is_valid(target):
+                allowed = await db.courses.find_one(
+                    {"_id": ObjectId(target), "instructor_id": user_id}, {"_id": 1}
+                ) is not None
+        if not allowed:
+            raise PermissionError(f"Not allowed to follow {topic}")
+
+
+# ---------- Server-Sent Events ----------
+@router.get("/events")
+async def live_events(
+    request: Request,
+    topics: str = Query(...),
+    token: str = Query(None),
+    db=Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    access_token = _bearer_token(request.headers, token)
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await user_from_token(access_token, db)
+    try:
+        topic_list = _parse_topics(topics.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await _check_topics(db, user, topic_list)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    subscription = await live_hub.subscribe(redis_client, topic_list)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    data = await asyncio.wait_for(subscription.queue.get(), settings.LIVE_KEEPALIVE_SECONDS)
+                    yield f"event: progress\ndata: {data}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            await live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------- WebSocket ----------
+@router.websocket("/ws")
+async def live_ws(
+    websocket: WebSocket,
+    topics: str = Query(""),
+    token: str = Query(None),
+    db=Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    await websocket.accept()
+    try:
+        user = await user_from_token(_bearer_token(websocket.headers, token) or "", db)
+        topic_list = _parse_topics(topics.split(","))
+        await _check_topics(db, user, topic_list)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    except (ValueError, PermissionError) as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    subscription = await live_hub.subscribe(redis_client, topic_list)
+
+    async def forward():
+        while True:
+            data = await subscription.queue.get()
+            await websocket.send_text(data)
+
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            try:
+                if message.get("subscribe"):
+                    wanted = _parse_topics(sorted(subscription.topics | set(message["subscribe"])))
+                    await _check_topics(db, user, set(wanted) - subscription.topics)
+                    await live_hub.add_topics(redis_client, subscription, wanted)
+                if message.get("unsubscribe"):
+                    await live_hub.remove_topics(subscription, _parse_topics(message["unsubscribe"]))
+            except (ValueError, PermissionError) as e:
+                await websocket.send_text(json.dumps({"error": str(e)}))
+    except (WebSocketDisconnect, json.JSONDecodeError, AttributeError):
+        pass
+    finally:
+        sender.cancel()
+        await live_hub.unsubscribe(subscription)
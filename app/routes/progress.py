@@ -1,16 +1,18 @@
 # app/routes/progress.py
 from bson import ObjectId
-from app.utils import cache
+from app.utils import cache, codec
 
-from app.dependencies import get_database, get_redis, redis_client
+from app.dependencies import get_database, get_redis
 from app.services.progress_service import ProgressService
+from app.models.progress import LESSON_ID_PATTERN, ProgressSyncRequest, ProgressSyncResponse
+from app.services.activity_service import ActivityService, EPOCH, HORIZON, in_range as activity_in_range
+from app.services.heartbeat_service import HeartbeatService
+from datetime import date
 from pymongo.database import Database
 #import redis
-import json
 # For example, auth.py
 from fastapi import APIRouter, Depends , Query, HTTPException, Path
 import redis.asyncio as redis
-from app.db import db,redis_client   # ✅ import db from app/db.py
 from app.utils.config import settings
 
 
@@ -18,7 +20,7 @@ router = APIRouter()
 # ---------- Lesson Completion ----------
 @router.post("/lessons/{lesson_id}/complete")
 async def complete_lesson(
-    lesson_id: str,
+    lesson_id: str = Path(..., pattern=LESSON_ID_PATTERN),
     user_id: str = Query(...),
     course_id: str = Query(...),
     time_spent: int = Query(0),
@@ -46,14 +48,17 @@ def serialize_progress(progress_list):
 
 
 @router.get("/dashboard")
-async def get_dashboard_data(user_id: str):
+async def get_dashboard_data(
+    user_id: str,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
     cache_key = f"user:{user_id}:dashboard"
 
     # 1️⃣ Check Redis cache first
     cached_data = await cache.get(redis_client, cache_key)
     if cached_data:
-        # Redis returns JSON string, convert back to dict
-        return json.loads(cached_data)
+        return cached_data
 
     # 2️⃣ Fetch all progress documents for the given user_id
     user_progress = await db.progress.find({"user_id": user_id}).to_list(length=None)
@@ -65,7 +70,7 @@ async def get_dashboard_data(user_id: str):
     result = {"progress": user_progress_serialized}
 
     # 4️⃣ Store in Redis for 15 minutes
-    await cache.set(redis_client, cache_key, json.dumps(result), ttl=900)
+    await cache.set(redis_client, cache_key, result, ttl=900)
 
     # 5️⃣ Return the result
     return result
@@ -75,47 +80,29 @@ async def get_dashboard_data(user_id: str):
 # GET /progress/courses/{course_id}
 # Cached user progress for one course
 # --------------------------------------------------
-# Helper to serialize ObjectId
-# Helper to serialize ObjectId
-def serialize_doc(doc):
-    doc_copy = dict(doc)
-    for k, v in doc_copy.items():
-        from bson import ObjectId
-        if isinstance(v, ObjectId):
-            doc_copy[k] = str(v)
-    return doc_copy
-
-
-# Helper to serialize ObjectId
-def serialize_doc(doc):
-    doc_copy = dict(doc)
-    for k, v in doc_copy.items():
-        if isinstance(v, ObjectId):
-            doc_copy[k] = str(v)
-    return doc_copy
-
-
-router = APIRouter()
-
 # Helper to serialize ObjectId
 def serialize_doc(doc):
     doc_copy = dict(doc)
-    from bson import ObjectId
     for k, v in doc_copy.items():
         if isinstance(v, ObjectId):
             doc_copy[k] = str(v)
     return doc_copy
 
 @router.get("/courses/{course_id}")
-async def course_progress(course_id: str = Path(...), user_id: str = Query(...)):
+async def course_progress(
+    course_id: str = Path(...),
+    user_id: str = Query(...),
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
     """Get progress of a user in a specific course (cached), including completion percentage."""
 
     cache_key = f"course:{course_id}:user:{user_id}"
 
     # 1️⃣ Check Redis cache
-    cached = await redis_client.get(cache_key)
-    if cached:
-        return {"cached": True, "data": json.loads(cached)}
+    cached = await codec.get(redis_client, cache_key)
+    if cached is not None:
+        return {"cached": True, "data": cached}
 
     # 2️⃣ Fetch progress document for this user & course
     progress_doc = await db.progress.find_one({
@@ -141,6 +128,55 @@ async def course_progress(course_id: str = Path(...), user_id: str = Query(...))
     progress_doc_serialized = serialize_doc(progress_doc)
 
     # 5️⃣ Cache the result for 15 minutes
-    await redis_client.set(cache_key, json.dumps(progress_doc_serialized), ex=900)
+    await codec.set(redis_client, cache_key, progress_doc_serialized, 900)
 
     return {"cached": False, "data": progress_doc_serialized}
+
+
+# ---------- Offline Batch Sync ----------
+@router.post("/sync", response_model=ProgressSyncResponse)
+async def sync_progress(
+    payload: ProgressSyncRequest,
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    """Replay queued offline lesson completions in one call (idempotent per event_id)."""
+    service = ProgressService(db, redis_client)
+    return await service.sync_progress_events(payload.user_id, payload.events)
+
+
+# ---------- Learning Streaks ----------
+@router.get("/streaks")
+async def learning_streaks(user_id: str = Query(...), redis_client: redis.Redis = Depends(get_redis)):
+    """Current and longest learning streak (cached 1 hour, reset on new activity)."""
+    return await ActivityService(redis_client).streak_summary(user_id)
+
+
+@router.get("/activity")
+async def learning_activity(
+    user_id: str = Query(...),
+    start: date = Query(...),
+    end: date = Query(...),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    if end < start or (end - start).days >= settings.ACTIVITY_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    if not (activity_in_range(start) and activity_in_range(end)):
+        raise HTTPException(status_code=400, detail=f"Dates must be between {EPOCH} and {HORIZON}")
+    active_days = await ActivityService(redis_client).active_days(user_id, start, end)
+    return {"user_id": user_id, "start": start, "end": end, "active_days": active_days}
+
+
+# ---------- Lesson Heartbeat ----------
+@router.post("/lessons/{lesson_id}/heartbeat")
+async def lesson_heartbeat(
+    lesson_id: str = Path(..., pattern=LESSON_ID_PATTERN),
+    user_id: str = Query(...),
+    course_id: str = Query(...),
+    seconds: int = Query(settings.HEARTBEAT_INTERVAL_SECONDS, ge=0),
+    db: Database = Depends(get_database),
+    redis_client: redis.Redis = Depends(get_redis)
+):
+    """Accumulate time-on-lesson in Redis; flushed to Mongo in bulk by a background job."""
+    await HeartbeatService(db, redis_client).record_heartbeat(user_id, course_id, lesson_id, seconds)
+    return {"status": "ok"}
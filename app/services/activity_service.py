@@ -0,0 +1,271 @@
+# app/services/activity_service.py
+
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+
+from app.utils.config import settings
+from app.utils.cache import cached
+
+logger = logging.getLogger(__name__)
+
+# Bit offsets are whole days. The forward bitmap counts from EPOCH, the reversed
+# one counts back from HORIZON so that BITPOS (which only scans forward) can walk
+# a streak towards the past as well as towards the future.
+EPOCH = date(2020, 1, 1)
+HORIZON = date(2040, 1, 1)
+
+
+def in_range(day: date) -> bool:
+    """Days outside [EPOCH, HORIZON] have no bit offset."""
+    return EPOCH <= day <= HORIZON
+
+
+def _as_day(when=None) -> date:
+    if when is None:
+        return datetime.utcnow().date()
+    if isinstance(when, datetime):
+        return when.date()
+    return when
+
+
+class ActivityService:
+    """
+    Per-user daily activity kept as Redis bitmaps (one bit per day).
+
+    Keys:
+    - learning_activity:{user_id}         forward day bitmap
+    - learning_activity:{user_id}:rev     same days, reversed offsets
+    - learning_activity:day:{YYYY-MM-DD}  platform bitmap, one bit per user index
+    - learning_activity:longest           sorted set of longest streak per user
+    - learning_streaks:{user_id}          cached streak summary (JSON)
+
+    Distinct-learner counts use HyperLogLogs (~12KB each, ~0.81% standard error):
+    - active_learners:day:{YYYY-MM-DD}
+    - active_learners:course:{course_id}:{YYYY-MM-DD}
+    """
+
+    USER_INDEX_KEY = "learning_activity:user_index"
+    USER_SEQ_KEY = "learning_activity:user_seq"
+    LONGEST_KEY = "learning_activity:longest"
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    # ---------- Keys & offsets ----------
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"learning_activity:{user_id}"
+
+    @staticmethod
+    def _user_rev_key(user_id: str) -> str:
+        return f"learning_activity:{user_id}:rev"
+
+    @staticmethod
+    def _day_key(day: date) -> str:
+        return f"learning_activity:day:{day.isoformat()}"
+
+    @staticmethod
+    def _hll_key(day: date, course_id: str = None) -> str:
+        if course_id:
+            return f"active_learners:course:{course_id}:{day.isoformat()}"
+        return f"active_learners:day:{day.isoformat()}"
+
+    @staticmethod
+    def _streaks_key(user_id: str) -> str:
+        return f"learning_streaks:{user_id}"
+
+    @staticmethod
+    def _fwd(day: date) -> int:
+        return (day - EPOCH).days
+
+    @staticmethod
+    def _rev(day: date) -> int:
+        return (HORIZON - day).days
+
+    async def user_index(self, user_id: str) -> int:
+        """Dense integer id for a user, used as bit offset in platform bitmaps."""
+        return (await self.user_indexes([user_id]))[user_id]
+
+    async def user_indexes(self, user_ids) -> dict:
+        """user_index for many users: one HMGET, plus one pipeline for users seen the first time."""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        indexes = dict(zip(user_ids, await self.redis.hmget(self.USER_INDEX_KEY, user_ids)))
+        new = [user_id for user_id, idx in indexes.items() if idx is None]
+        if new:
+            last = await self.redis.incrby(self.USER_SEQ_KEY, len(new))
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for candidate, user_id in enumerate(new, start=last - len(new) + 1):
+                    pipe.hsetnx(self.USER_INDEX_KEY, user_id, candidate)
+                await pipe.execute()
+            # Another worker may have won the HSETNX; read back what stuck
+            indexes.update(zip(new, await self.redis.hmget(self.USER_INDEX_KEY, new)))
+        return {user_id: int(idx) for user_id, idx in indexes.items()}
+
+    async def _run_end(self, key: str, offset: int) -> int:
+        """First clear bit at or after offset (bitmaps are zero-padded to the right)."""
+        pos = await self.redis.bitpos(key, 0, offset, -1, "BIT")
+        if pos == -1:
+            pos = await self.redis.strlen(key) * 8
+        return pos
+
+    # ---------- Writes ----------
+    async def record_activity(self, user_id: str, when=None):
+        """Mark the user active on the given day (defaults to today, UTC)."""
+        await self.record_activities(user_id, [when])
+
+    async def record_activities(self, user_id: str, whens):
+        await self.record_many({user_id: whens})
+
+    async def record_many(self, activity: dict):
+        """activity: user_id -> iterable of datetimes/dates. Bits for all users go in one pipeline."""
+        days_by_user = {}
+        for user_id, whens in activity.items():
+            days = sorted({_as_day(w) for w in whens})
+            if days and not (in_range(days[0]) and in_range(days[-1])):
+                logger.warning("Ignoring activity of %s outside %s..%s", user_id, EPOCH, HORIZON)
+                days = [day for day in days if in_range(day)]
+            if days:
+                days_by_user[user_id] = days
+        if not days_by_user:
+            return
+        indexes = await self.user_indexes(days_by_user)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, days in days_by_user.items():
+                for day in days:
+                    pipe.setbit(self._user_key(user_id), self._fwd(day), 1)
+                    pipe.setbit(self._user_rev_key(user_id), self._rev(day), 1)
+                    pipe.setbit(self._day_key(day), indexes[user_id], 1)
+                    pipe.expire(self._day_key(day), settings.ACTIVITY_DAY_RETENTION_DAYS * 86400)
+                pipe.delete(self._streaks_key(user_id))
+            results = iter(await pipe.execute())
+
+        # Only a newly active day can lengthen the longest streak
+        new_days = []
+        for user_id, days in days_by_user.items():
+            for day in days:
+                was_set = next(results)
+                for _ in range(3):
+                    next(results)
+                if not was_set:
+                    new_days.append((user_id, day))
+            next(results)  # DELETE of the cached streak summary
+        if not new_days:
+            return
+
+        # First clear bit after the day in both directions (bitmaps are zero-padded to the right)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, day in new_days:
+                pipe.bitpos(self._user_key(user_id), 0, self._fwd(day), -1, "BIT")
+                pipe.strlen(self._user_key(user_id))
+                pipe.bitpos(self._user_rev_key(user_id), 0, self._rev(day), -1, "BIT")
+                pipe.strlen(self._user_rev_key(user_id))
+            runs = await pipe.execute()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for i, (user_id, day) in enumerate(new_days):
+                fwd_pos, fwd_len, rev_pos, rev_len = runs[4 * i:4 * i + 4]
+                newer = (fwd_pos if fwd_pos != -1 else fwd_len * 8) - self._fwd(day)
+                older = (rev_pos if rev_pos != -1 else rev_len * 8) - self._rev(day)
+                pipe.zadd(self.LONGEST_KEY, {user_id: newer + older - 1}, gt=True)
+            await pipe.execute()
+
+    async def count_learners(self, entries):
+        """PFADD learners into the per-day and per-course-day HyperLogLogs. entries: (user_id, course_id, when)"""
+        per_key = {}
+        for user_id, course_id, when in entries:
+            day = _as_day(when)
+            per_key.setdefault(self._hll_key(day), set()).add(user_id)
+            per_key.setdefault(self._hll_key(day, course_id), set()).add(user_id)
+        if not per_key:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, user_ids in per_key.items():
+                pipe.pfadd(key, *user_ids)
+                pipe.expire(key, settings.ACTIVITY_DAY_RETENTION_DAYS * 86400)
+            await pipe.execute()
+
+    # ---------- Reads ----------
+    async def distinct_learners(self, start: date, end: date, course_id: str = None) -> int:
+        """Approximate distinct learners over [start, end]; PFCOUNT unions the daily HLLs."""
+        keys = [self._hll_key(start + timedelta(days=i), course_id) for i in range((end - start).days + 1)]
+        return await self.redis.pfcount(*keys)
+
+    async def active_learner_counts(self, course_id: str = None, today=None) -> dict:
+        today = _as_day(today)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for window in (1, 7, 30):
+                pipe.pfcount(*[self._hll_key(today - timedelta(days=i), course_id) for i in range(window)])
+            dau, wau, mau = await pipe.execute()
+        return {"course_id": course_id, "date": today.isoformat(), "dau": dau, "wau": wau, "mau": mau}
+
+    async def current_streak(self, user_id: str, today=None) -> int:
+        """Consecutive active days ending today, or yesterday if today has no activity yet."""
+        today = _as_day(today)
+        start = today
+        if not await self.redis.getbit(self._user_key(user_id), self._fwd(today)):
+            start = today - timedelta(days=1)
+            if not await self.redis.getbit(self._user_key(user_id), self._fwd(start)):
+                return 0
+        return await self._run_end(self._user_rev_key(user_id), self._rev(start)) - self._rev(start)
+
+    async def longest_streak(self, user_id: str) -> int:
+        score = await self.redis.zscore(self.LONGEST_KEY, user_id)
+        return int(score or 0)
+
+    async def active_days(self, user_id: str, start: date, end: date) -> int:
+        """Number of active days in [start, end], clamped to [EPOCH, HORIZON]."""
+        start, end = max(start, EPOCH), min(end, HORIZON)
+        if end < start:
+            return 0
+        return await self.redis.bitcount(self._user_key(user_id), self._fwd(start), self._fwd(end), "BIT")
+
+    async def total_active_days(self, user_id: str) -> int:
+        return await self.redis.bitcount(self._user_key(user_id))
+
+    @cached("learning_streaks:{user_id}", ttl="LEARNING_STREAKS_TTL")
+    async def streak_summary(self, user_id: str, refresh: bool = False) -> dict:
+        today = _as_day()
+        current = await self.current_streak(user_id, today)
+        longest = max(await self.longest_streak(user_id), current)
+        if current:
+            ends_today = await self.redis.getbit(self._user_key(user_id), self._fwd(today))
+            last_day = today if ends_today else today - timedelta(days=1)
+            streak_start = (last_day - timedelta(days=current - 1)).isoformat()
+        else:
+            streak_start = None
+
+        response = {
+            "user_id": user_id,
+            "current_streak": current,
+            "longest_streak": longest,
+            "streak_start_date": streak_start,
+            "active_days_last_30": await self.active_days(user_id, today - timedelta(days=29), today),
+        }
+        return response
+
+    async def daily_actives(self, start: date, end: date) -> dict:
+        """Distinct active learners per day plus the distinct total over the range (BITOP OR)."""
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        day_keys = [self._day_key(day) for day in days]
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in day_keys:
+                pipe.bitcount(key)
+            counts = await pipe.execute()
+
+        union_key = f"learning_activity:tmp:{uuid.uuid4().hex}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.bitop("OR", union_key, *day_keys)
+            pipe.bitcount(union_key)
+            pipe.delete(union_key)
+            _, distinct, _ = await pipe.execute()
+
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "distinct_active_learners": distinct,
+            "daily": [{"date": day.isoformat(), "active_learners": n} for day, n in zip(days, counts)],
+        }
@@ -1,80 +1,227 @@
-import json
-from datetime import datetime
+import logging
+from bson import ObjectId
+from datetime import datetime, timedelta
+from redis.exceptions import ConnectionError, TimeoutError
 from app.utils.config import settings
+from app.utils.cache import cached
+from app.services.course_stats_service import CourseStatsService
+from app.services.activity_service import ActivityService
+from app.services.lesson_difficulty_service import LessonDifficultyService
+
+logger = logging.getLogger(__name__)
 
 class AnalyticsService:
     def __init__(self, db, redis_client):
         self.db = db
         self.redis = redis_client
+        self.course_stats = CourseStatsService(db)
+        self.activity = ActivityService(redis_client)
+        self.difficulty = LessonDifficultyService(db, redis_client)
 
-    async def course_performance(self, course_id: str):
-        cache_key = f"analytics:course:{course_id}"
-        cached = await self.redis.get(cache_key)
-        if cached:
-            return json.loads(cached)  # parse JSON string
+    @cached("analytics:course:{course_id}", ttl="ANALYTICS_COURSE_TTL")
+    async def course_performance(self, course_id: str, refresh: bool = False):
+        # Single-document read from the incrementally maintained course_stats view;
+        # a course seen for the first time is built once from progress
+        stats = await self.course_stats.get(course_id)
+        if stats is None:
+            await self.course_stats.reconcile(course_id)
+            stats = await self.course_stats.get(course_id) or {}
 
-        pipeline = [
-            {"$match": {"course_id": course_id}},
-            {"$unwind": "$lessons"},
-            {"$group": {"_id": "$course_id", "avg_score": {"$avg": {"$avg": "$lessons.quiz_scores"}}}}
+        lessons = [
+            {
+                "lesson_id": lesson_id,
+                "completions": l.get("completions", 0),
+                "avg_score": l["score_sum"] / l["score_count"] if l.get("score_count") else 0,
+                "avg_time_spent": l.get("time_sum", 0) / l["completions"] if l.get("completions") else 0,
+            }
+            for lesson_id, l in stats.get("lessons", {}).items()
         ]
-        result = await self.db.progress.aggregate(pipeline).to_list(length=None)
+        try:
+            difficulty = await self.difficulty.summary(course_id)
+        except (ConnectionError, TimeoutError):
+            # Redis-only fields; the rest comes from Mongo
+            logger.warning("Course %s performance served without difficulty data, Redis unavailable", course_id)
+            difficulty = {"most_difficult_lessons": [], "completion_by_module": {}}
         response = {
             "course_id": course_id,
-            "avg_score": result[0]["avg_score"] if result else 0,
+            "avg_score": stats["score_sum"] / stats["score_count"] if stats.get("score_count") else 0,
+            "total_enrollments": stats.get("enrollments", 0),
+            "total_completions": stats.get("completions", 0),
+            "avg_time_per_lesson": stats.get("time_sum", 0) / stats["completions"] if stats.get("completions") else 0,
+            "lessons": lessons,
+            "most_difficult_lessons": [l["lesson_id"] for l in difficulty["most_difficult_lessons"]],
+            "completion_by_module": difficulty["completion_by_module"],
             "last_cached": datetime.utcnow().isoformat()
         }
-        await self.redis.set(cache_key, json.dumps(response), ex=settings.ANALYTICS_COURSE_TTL)
         return response
 
-    async def student_learning_patterns(self, student_id: str):
-        cache_key = f"analytics:students:{student_id}"
-        cached = await self.redis.get(cache_key)
-        if cached:
-            return json.loads(cached)
+    @cached("analytics:student:{student_id}", ttl="ANALYTICS_STUDENT_TTL")
+    async def student_learning_patterns(self, student_id: str, refresh: bool = False):
+        lessons = {"$ifNull": ["$lessons", []]}
+        pipeline = [
+            {"$match": {"user_id": student_id}},
+            # Reduce each progress doc to a handful of numbers before anything leaves the server
+            {"$project": {
+                "course_oid": {"$convert": {"input": "$course_id", "to": "objectId", "onError": None, "onNull": None}},
+                "touched": {"$size": lessons},
+                "completed": {"$size": {"$filter": {"input": lessons, "cond": "$$this.completed"}}},
+                "time": {"$sum": {"$map": {"input": lessons, "in": {"$ifNull": ["$$this.time_spent_seconds", 0]}}}},
+                "score_sum": {"$sum": {"$map": {"input": lessons, "in": {
+                    "$ifNull": ["$$this.quiz_summary.sum", {"$sum": "$$this.quiz_scores"}]
+                }}}},
+                "score_count": {"$sum": {"$map": {"input": lessons, "in": {
+                    "$ifNull": ["$$this.quiz_summary.count", {"$size": {"$ifNull": ["$$this.quiz_scores", []]}}]
+                }}}},
+            }},
+            {"$lookup": {
+                "from": "courses",
+                "let": {"course_oid": "$course_oid"},
+                "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$course_oid"]}}}, {"$project": {"category": 1}}],
+                "as": "course",
+            }},
+            {"$set": {"category": {"$ifNull": [{"$arrayElemAt": ["$course.category", 0]}, "uncategorized"]}}},
+            {"$facet": {
+                "totals": [{"$group": {
+                    "_id": None,
+                    "courses": {"$sum": 1},
+                    "touched": {"$sum": "$touched"},
+                    "completed": {"$sum": "$completed"},
+                    "time": {"$sum": "$time"},
+                    "score_sum": {"$sum": "$score_sum"},
+                    "score_count": {"$sum": "$score_count"},
+                }}],
+                "categories": [
+                    {"$group": {"_id": "$category", "score_sum": {"$sum": "$score_sum"}, "score_count": {"$sum": "$score_count"}}},
+                    {"$match": {"score_count": {"$gt": 0}}},
+                    {"$project": {"avg_score": {"$divide": ["$score_sum", "$score_count"]}}},
+                    {"$sort": {"avg_score": -1}},
+                ],
+            }},
+        ]
+        result = await self.db.progress.aggregate(pipeline).to_list(length=1)
+        facets = result[0] if result else {}
+        totals = facets["totals"][0] if facets.get("totals") else {}
+        categories = facets.get("categories", [])
 
-        records = await self.db.progress.find({"user_id": student_id}).to_list(None)
-        lessons_completed = sum(len(r.get("lessons", [])) for r in records)
-        avg_quiz_score = (
-            sum(
-                sum(l.get("quiz_scores", [0])) / len(l.get("quiz_scores", [1]))
-                for r in records
-                for l in r.get("lessons", [])
-            )
-            if records else 0
+        lessons_completed = totals.get("completed", 0)
+        touched = totals.get("touched", 0)
+        avg_quiz_score = totals["score_sum"] / totals["score_count"] if totals.get("score_count") else 0
+
+        # Activity comes from the day bitmaps, no history scan needed
+        today = datetime.utcnow().date()
+        active_days_30 = await self.activity.active_days(student_id, today - timedelta(days=29), today)
+        active_days_total = await self.activity.total_active_days(student_id)
+        lessons_per_active_day = lessons_completed / active_days_total if active_days_total else 0
+
+        engagement_score = round(
+            5 * active_days_30 / 30
+            + 3 * (lessons_completed / touched if touched else 0)
+            + 2 * min(avg_quiz_score / settings.QUIZ_SCORE_MAX, 1),
+            1
         )
         response = {
             "student_id": student_id,
             "lessons_completed": lessons_completed,
             "avg_quiz_score": avg_quiz_score,
-            "engagement_level": "high" if lessons_completed > 0 else "low",
+            "engagement_level": "high" if engagement_score >= 7 else "medium" if engagement_score >= 4 else "low",
+            "engagement_score": engagement_score,
+            "courses_enrolled": totals.get("courses", 0),
+            "total_time_spent": totals.get("time", 0),
+            # No session tracking yet: average time per lesson worked on
+            "avg_session_duration": totals.get("time", 0) / touched if touched else 0,
+            "active_days_last_30": active_days_30,
+            "lessons_per_active_day": lessons_per_active_day,
+            "learning_velocity": (
+                "fast" if lessons_per_active_day >= 3 else "moderate" if lessons_per_active_day >= 1 else "slow"
+            ),
+            "strong_subjects": [c["_id"] for c in categories if c["avg_score"] >= 70][:3],
+            "areas_for_improvement": [c["_id"] for c in reversed(categories) if c["avg_score"] < 60][:3],
             "last_cached": datetime.utcnow().isoformat()
         }
-        await self.redis.set(cache_key, json.dumps(response), ex=1800)  # 30 minutes
         return response
 
-    async def platform_overview(self):
-        cache_key = "analytics:platform:overview"
-        cached = await self.redis.get(cache_key)
-        if cached:
-            return json.loads(cached)
-
-        records = await self.db.progress.find().to_list(None)
-        total_students = len(set(r["user_id"] for r in records))
-        total_courses = len(set(r["course_id"] for r in records))
-        avg_completion_rate = sum(r.get("completion", 0) for r in records) / len(records) if records else 0
+    @cached("analytics:platform:overview", ttl="ANALYTICS_PLATFORM_TTL")
+    async def platform_overview(self, refresh: bool = False):
+        # Everything is computed server-side in one pass; only the small
+        # facet results come back, so worker memory doesn't grow with the collection
+        pipeline = [
+            {"$facet": {
+                "students": [{"$group": {"_id": "$user_id"}}, {"$count": "count"}],
+                "courses": [{"$group": {"_id": "$course_id"}}, {"$count": "count"}],
+                # Learner-weighted mean of completed lessons / lessons in the course, in percent
+                "completion": [
+                    {"$group": {
+                        "_id": "$course_id",
+                        "learners": {"$sum": 1},
+                        "done": {"$sum": {"$size": {"$filter": {
+                            "input": {"$ifNull": ["$lessons", []]}, "cond": "$$this.completed"
+                        }}}},
+                    }},
+                    {"$lookup": {
+                        "from": "courses",
+                        "let": {"course_oid": {"$convert": {
+                            "input": "$_id", "to": "objectId", "onError": None, "onNull": None
+                        }}},
+                        "pipeline": [
+                            {"$match": {"$expr": {"$eq": ["$_id", "$$course_oid"]}}},
+                            {"$project": {"lessons": {"$sum": {"$map": {
+                                "input": {"$ifNull": ["$modules", []]},
+                                "in": {"$size": {"$ifNull": ["$$this.lessons", []]}},
+                            }}}}},
+                        ],
+                        "as": "course",
+                    }},
+                    {"$set": {"total": {"$ifNull": [{"$arrayElemAt": ["$course.lessons", 0]}, 0]}}},
+                    {"$match": {"total": {"$gt": 0}}},
+                    {"$group": {
+                        "_id": None,
+                        "learners": {"$sum": "$learners"},
+                        "completed": {"$sum": {"$min": [{"$divide": ["$done", "$total"]}, "$learners"]}},
+                    }},
+                    {"$project": {"avg": {"$multiply": [100, {"$divide": ["$completed", "$learners"]}]}}},
+                ],
+                "popular": [
+                    {"$sortByCount": "$course_id"},
+                    {"$limit": settings.PLATFORM_TOP_COURSES},
+                    {"$project": {"_id": 0, "course_id": "$_id", "enrollments": "$count"}}
+                ],
+            }}
+        ]
+        result = await self.db.progress.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+        facets = result[0] if result else {}
+        total_students = facets["students"][0]["count"] if facets.get("students") else 0
+        total_courses = facets["courses"][0]["count"] if facets.get("courses") else 0
+        avg_completion_rate = (facets["completion"][0]["avg"] or 0) if facets.get("completion") else 0
+        most_popular_courses = facets.get("popular", [])
 
-        course_counts = {}
-        for r in records:
-            course_counts[r["course_id"]] = course_counts.get(r["course_id"], 0) + 1
-        most_popular_courses = [{"course_id": k, "enrollments": v} for k, v in course_counts.items()]
+        try:
+            monthly_active_users = (await self.activity.active_learner_counts())["mau"]
+        except (ConnectionError, TimeoutError):
+            logger.warning("Platform overview served without active users, Redis unavailable")
+            monthly_active_users = None
 
         response = {
             "total_students": total_students,
             "total_courses": total_courses,
             "avg_completion_rate": avg_completion_rate,
             "most_popular_courses": most_popular_courses,
+            "monthly_active_users": monthly_active_users,
             "last_cached": datetime.utcnow().isoformat()
         }
-        await self.redis.set(cache_key, json.dumps(response), ex=3600)  # 1 hour
+        return response
+
+    @cached("popular_courses", ttl="POPULAR_COURSES_TTL")
+    async def popular_courses(self, refresh: bool = False):
+        stats = await self.db.course_stats.find(
+            {}, {"enrollments": 1}
+        ).sort("enrollments", -1).limit(settings.PLATFORM_TOP_COURSES).to_list(length=None)
+        oids = [ObjectId(s["_id"]) for s in stats if ObjectId.is_valid(s["_id"])]
+        titles = {
+            str(c["_id"]): c.get("title")
+            async for c in self.db.courses.find({"_id": {"$in": oids}}, {"title": 1})
+        }
+        response = [
+            {"id": s["_id"], "title": titles.get(s["_id"]), "enrollments": s.get("enrollments", 0)}
+            for s in stats
+        ]
         return response
@@ -1,6 +1,7 @@
 
 import redis.asyncio as aioredis
 from app.dependencies import verify_password, create_access_token
+from app.utils.cache_stats import cache_stats
 from fastapi.security import HTTPBearer
 from fastapi.openapi.models import HTTPBearer as HTTPBearerModel
 
@@ -38,6 +39,7 @@ async def login_user(db, redis_client: aioredis.Redis, username: str, password:
 
         # Save session in Redis
         await redis_client.setex(f"user_session:{str(user['_id'])}", 86400, str(user))
+        cache_stats.record_fill(f"user_session:{str(user['_id'])}")
         await redis_client.setex(f"refresh_tokens:{user['username']}", 604800, access_token)
 
         return {
@@ -133,6 +135,7 @@ async def validate_token_against_redis(redis_client, username: str, token_jti: s
     try:
         # Check if user session exists
         session = await redis_client.get(f"user_session:{username}")
+        cache_stats.record_lookup(f"user_session:{username}", session)
         if not session:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,175 @@
+# app/services/cache_flush_service.py
+
+import asyncio
+import logging
+import re
+import time
+import uuid
+from datetime import datetime
+
+from app.utils.config import settings
+from app.utils.cache_stats import namespace
+
+logger = logging.getLogger(__name__)
+
+# Cache namespaces that may be flushed (see cache_stats.namespace)
+FLUSHABLE_NAMESPACES = {
+    "course",
+    "courses_list",
+    "progress",
+    "user_dashboard",
+    "analytics:course",
+    "analytics:student",
+    "analytics:platform",
+    "popular_courses",
+    "learning_streaks",
+    "course_outline",
+}
+# Key prefixes each flushable namespace lives under, used to reject patterns
+# that can't match any of them (progress and dashboards use two layouts)
+NAMESPACE_PREFIXES = {
+    "course": ("course:",),
+    "courses_list": ("courses_list:",),
+    "progress": ("progress:", "course:"),
+    "user_dashboard": ("user_dashboard:", "user:"),
+    "analytics:course": ("analytics:course",),
+    "analytics:student": ("analytics:student",),
+    "analytics:platform": ("analytics:platform",),
+    "popular_courses": ("popular_courses",),
+    "learning_streaks": ("learning_streaks:",),
+    "course_outline": ("course_outline:",),
+}
+_GLOB_CHARS = re.compile(r"[*?\[\\]")
+# Never deleted, even when matched by an explicit pattern
+PROTECTED_NAMESPACES = {"sessions", "refresh_token", "refresh_tokens", "blacklisted_tokens", "cache_flush"}
+
+LOCK_KEY = "cache_flush:lock"
+
+
+class CacheFlushService:
+    """
+    Selective cache flush. Keys are walked with batched SCAN, classified by
+    namespace and removed with pipelined UNLINK (memory is reclaimed in a
+    background thread on the Redis side). Batches are paced to
+    CACHE_FLUSH_KEYS_PER_SECOND so a large flush doesn't spike Redis latency.
+    Job state lives in the cache_flush:{job_id} hash.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"cache_flush:{job_id}"
+
+    @staticmethod
+    def _pattern_namespaces(pattern: str) -> set:
+        """Flushable namespaces whose keys the pattern could match, judged by its literal prefix."""
+        prefix = _GLOB_CHARS.split(pattern, 1)[0]
+        return {
+            ns for ns, key_prefixes in NAMESPACE_PREFIXES.items()
+            if any(prefix.startswith(p) or p.startswith(prefix) for p in key_prefixes)
+        }
+
+    @classmethod
+    def validate(cls, namespaces=None, pattern: str = None):
+        """Raises ValueError for unknown namespaces or a pattern outside every flushable namespace."""
+        unknown = set(namespaces or ()) - FLUSHABLE_NAMESPACES
+        if unknown:
+            raise ValueError(f"Not a flushable namespace: {', '.join(sorted(unknown))}")
+        if pattern is not None:
+            if not pattern.strip():
+                raise ValueError("pattern must not be empty")
+            if not cls._pattern_namespaces(pattern) & set(namespaces or FLUSHABLE_NAMESPACES):
+                raise ValueError("pattern does not match any flushable cache namespace")
+
+    @staticmethod
+    def _selected(key: str, namespaces) -> bool:
+        ns = namespace(key)
+        return ns in namespaces and ns not in PROTECTED_NAMESPACES
+
+    async def start(self, namespaces=None, pattern: str = None, dry_run: bool = False, requested_by: str = None):
+        """Create a job and take the flush lock; returns the job, or None if a flush is already running."""
+        job_id = uuid.uuid4().hex
+        if not await self.redis.set(LOCK_KEY, job_id, nx=True, ex=settings.CACHE_FLUSH_LOCK_SECONDS):
+            return None
+        job = {
+            "job_id": job_id,
+            "namespaces": ",".join(sorted(namespaces or ())),
+            "pattern": pattern or "",
+            "dry_run": int(dry_run),
+            "status": "queued",
+            "scanned": 0,
+            "matched": 0,
+            "deleted": 0,
+            "requested_by": requested_by or "",
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping=job)
+            pipe.expire(self._job_key(job_id), settings.CACHE_FLUSH_JOB_TTL)
+            await pipe.execute()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str):
+        raw = await self.redis.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        job = dict(raw)
+        for field in ("scanned", "matched", "deleted", "dbsize"):
+            if field in job:
+                job[field] = int(job[field])
+        job["dry_run"] = job.get("dry_run") == "1"
+        job["namespaces"] = job["namespaces"].split(",") if job.get("namespaces") else []
+        if job.get("dbsize"):
+            job["progress"] = round(min(100.0, 100 * job["scanned"] / job["dbsize"]), 1)
+        return job
+
+    async def run(self, job_id: str):
+        job = await self.get(job_id)
+        pattern = job["pattern"] or None
+        # A pattern only narrows the cache namespaces; Redis-only data is never selected
+        namespaces = (set(job["namespaces"]) or FLUSHABLE_NAMESPACES) & FLUSHABLE_NAMESPACES
+        batch = settings.CACHE_FLUSH_BATCH
+        min_batch_seconds = batch / settings.CACHE_FLUSH_KEYS_PER_SECOND
+        counts = {"scanned": 0, "matched": 0, "deleted": 0}
+
+        await self.redis.hset(self._job_key(job_id), mapping={
+            "status": "running",
+            "started_at": datetime.utcnow().isoformat(),
+            "dbsize": await self.redis.dbsize(),
+        })
+        try:
+            cursor = 0
+            while True:
+                started = time.monotonic()
+                cursor, keys = await self.redis.scan(cursor, match=pattern, count=batch)
+                counts["scanned"] += len(keys)
+                selected = [key for key in keys if self._selected(key, namespaces)]
+                counts["matched"] += len(selected)
+                if selected and not job["dry_run"]:
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        for i in range(0, len(selected), batch):
+                            pipe.unlink(*selected[i:i + batch])
+                        counts["deleted"] += sum(await pipe.execute())
+
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hset(self._job_key(job_id), mapping=counts)
+                    pipe.expire(LOCK_KEY, settings.CACHE_FLUSH_LOCK_SECONDS)
+                    await pipe.execute()
+                if cursor == 0:
+                    break
+                # Pace the walk: at most CACHE_FLUSH_KEYS_PER_SECOND keys scanned
+                await asyncio.sleep(max(0.0, min_batch_seconds - (time.monotonic() - started)))
+
+            await self.redis.hset(self._job_key(job_id), mapping={
+                "status": "done", "finished_at": datetime.utcnow().isoformat()
+            })
+        except Exception as e:
+            logger.exception("Cache flush %s failed", job_id)
+            await self.redis.hset(self._job_key(job_id), mapping={
+                "status": "failed", "error": str(e), "finished_at": datetime.utcnow().isoformat()
+            })
+        finally:
+            if await self.redis.get(LOCK_KEY) == job_id:
+                await self.redis.delete(LOCK_KEY)
@@ -0,0 +1,139 @@
+# app/services/cache_warmer.py
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.utils.config import settings
+from app.services.analytics_service import AnalyticsService
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "cache_warmer:leader"
+TRAFFIC_KEY = "cache_warmer:course_traffic"  # ranking over the window, rebuilt each cycle
+
+# Renew/release only if we still own the lease
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _traffic_hour_key(hour: datetime) -> str:
+    return f"{TRAFFIC_KEY}:{hour:%Y%m%d%H}"
+
+
+async def record_course_traffic(redis_client, course_id: str):
+    """
+    Count a course analytics request in the current hour's sorted set; the
+    warmer keeps the busiest courses of the last CACHE_WARM_TRAFFIC_WINDOW_HOURS
+    hot. Best-effort.
+    """
+    key = _traffic_hour_key(datetime.utcnow())
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zincrby(key, 1, course_id)
+            pipe.expire(key, (settings.CACHE_WARM_TRAFFIC_WINDOW_HOURS + 1) * 3600)
+            await pipe.execute()
+    except (ConnectionError, TimeoutError):
+        pass
+
+
+class CacheWarmer:
+    """
+    Background cache warming. Every worker runs the loop, but only the one
+    holding the Redis lease (SET NX PX) does the work, so hot keys are
+    recomputed once per cycle for the whole deployment.
+    """
+
+    def __init__(self, db, redis_client):
+        self.db = db
+        self.redis = redis_client
+        self.token = uuid.uuid4().hex
+        self.analytics = AnalyticsService(db, redis_client)
+
+    async def acquire_lease(self) -> bool:
+        lease_ms = settings.CACHE_WARM_LEASE_SECONDS * 1000
+        if await self.redis.set(LEASE_KEY, self.token, nx=True, px=lease_ms):
+            return True
+        return bool(await self.redis.eval(_RENEW_SCRIPT, 1, LEASE_KEY, self.token, lease_ms))
+
+    async def release_lease(self):
+        await self.redis.eval(_RELEASE_SCRIPT, 1, LEASE_KEY, self.token)
+
+    async def top_courses(self) -> list:
+        """Busiest courses over the traffic window: ZUNIONSTORE of the hourly sets, which expire on their own."""
+        now = datetime.utcnow()
+        hours = [_traffic_hour_key(now - timedelta(hours=i)) for i in range(settings.CACHE_WARM_TRAFFIC_WINDOW_HOURS)]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zunionstore(TRAFFIC_KEY, hours)
+            pipe.expire(TRAFFIC_KEY, settings.CACHE_WARM_LEASE_SECONDS)
+            pipe.zrevrange(TRAFFIC_KEY, 0, settings.CACHE_WARM_TOP_COURSES - 1)
+            return (await pipe.execute())[-1]
+
+    async def warm_cycle(self) -> dict:
+        """Recompute hot keys in priority order until the per-cycle time budget runs out."""
+        deadline = time.monotonic() + settings.CACHE_WARM_BUDGET_SECONDS
+        warmed, skipped = [], []
+
+        top_courses = await self.top_courses()
+        jobs = [
+            ("analytics:platform:overview", lambda: self.analytics.platform_overview(refresh=True)),
+            ("popular_courses", lambda: self.analytics.popular_courses(refresh=True)),
+        ] + [
+            (f"analytics:course:{course_id}",
+             lambda course_id=course_id: self.analytics.course_performance(course_id, refresh=True))
+            for course_id in top_courses
+        ]
+
+        for key, job in jobs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                skipped.append(key)
+                continue
+            try:
+                await asyncio.wait_for(job(), remaining)
+                warmed.append(key)
+            except asyncio.TimeoutError:
+                skipped.append(key)
+            except Exception:
+                logger.exception("Cache warming failed for %s", key)
+                skipped.append(key)
+        return {"warmed": warmed, "skipped": skipped}
+
+    def _jittered(self, seconds: float) -> float:
+        jitter = settings.CACHE_WARM_JITTER
+        return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+    async def run(self):
+        # Short random initial delay so a fleet restart doesn't stampede the lease
+        await asyncio.sleep(random.uniform(0, settings.CACHE_WARM_JITTER * settings.CACHE_WARM_INTERVAL))
+        try:
+            while True:
+                try:
+                    if await self.acquire_lease():
+                        result = await self.warm_cycle()
+                        logger.info("Cache warm cycle: %s", result)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Cache warm cycle failed")
+                await asyncio.sleep(self._jittered(settings.CACHE_WARM_INTERVAL))
+        finally:
+            try:
+                await self.release_lease()
+            except Exception:
+                pass
@@ -1,8 +1,14 @@
 from app.utils.config import settings
-import json
+from app.utils import codec
+from app.utils.cache import NEGATIVE, cached, jittered_ttl
+from app.utils.local_cache import LocalCache, MISSING
+from app.utils.redis_breaker import invalidate, run_or_defer
 from fastapi.encoders import jsonable_encoder
 from bson import ObjectId
 
+# Per-worker copies of course:{id} entries for batch reads
+course_l1 = LocalCache(settings.COURSE_L1_MAXSIZE, settings.COURSE_L1_TTL)
+
 class CourseService:
     def __init__(self, db, redis_client):
         self.db = db
@@ -11,36 +17,72 @@ class CourseService:
     async def create_course(self, course_data: dict):
         course_data = jsonable_encoder(course_data)
         result = await self.db.courses.insert_one(course_data)
-        await self.invalidate_cache("courses_list:*")
+        await self._invalidate_lists()
         return str(result.inserted_id)
 
-    async def get_course(self, course_id: str):
-        cache_key = f"course:{course_id}"
-        cached = await self.redis.get(cache_key)
-        if cached:
-            return json.loads(cached)
+    # A missing course is cached briefly too (CACHE_NEGATIVE_TTL)
+    @cached("course:{course_id}", ttl="COURSE_CACHE_TTL")
+    async def get_course(self, course_id: str, refresh: bool = False):
+        return await self.db.courses.find_one({"_id": ObjectId(course_id)})
+
+    async def get_courses(self, course_ids) -> dict:
+        """
+        Batch get_course: course_id -> course document (None if not found).
+        Resolved from the local L1, then one MGET of the same course:{id}
+        entries get_course uses, then one $in query for what's left, which is
+        written back to Redis in one pipeline.
+        """
+        found, misses = {}, []
+        for course_id in dict.fromkeys(course_ids):
+            course = course_l1.get(course_id)
+            if course is MISSING:
+                misses.append(course_id)
+            else:
+                found[course_id] = course
+        if not misses:
+            return found
 
-        course = await self.db.courses.find_one({"_id": ObjectId(course_id)})
-        if course:
-            await self.redis.set(cache_key, json.dumps(course), ex=settings.COURSE_CACHE_TTL)
-        return course
+        unresolved = []
+        for course_id, course in zip(misses, await codec.mget(self.redis, [f"course:{i}" for i in misses])):
+            if course is None:
+                unresolved.append(course_id)
+            else:
+                found[course_id] = None if course == NEGATIVE else course
+                course_l1.set(course_id, found[course_id])
+        if not unresolved:
+            return found
 
-    async def list_courses(self, filters=None):
-        filters = filters or {}
-        filters_key = str(filters)
-        cached = await self.redis.get(f"courses_list:{filters_key}")
-        if cached:
-            return json.loads(cached)
+        oids = [ObjectId(i) for i in unresolved if ObjectId.is_valid(i)]
+        docs = {}
+        if oids:
+            async for doc in self.db.courses.find({"_id": {"$in": oids}}):
+                doc["_id"] = str(doc["_id"])
+                docs[doc["_id"]] = doc
+        backfill = []
+        for course_id in unresolved:
+            course = docs.get(course_id)
+            found[course_id] = course
+            if not ObjectId.is_valid(course_id):
+                continue
+            course_l1.set(course_id, course)
+            if course is None:
+                backfill.append((f"course:{course_id}", NEGATIVE, jittered_ttl(settings.CACHE_NEGATIVE_TTL)))
+            else:
+                backfill.append((f"course:{course_id}", course, jittered_ttl(settings.COURSE_CACHE_TTL)))
+        await codec.set_many(self.redis, backfill)
+        return found
 
-        courses = await self.db.courses.find(filters).to_list(50)
-        await self.redis.set(f"courses_list:{filters_key}", json.dumps(courses), ex=settings.COURSES_LIST_CACHE_TTL)
-        return courses
+    @cached("courses_list:{filters}", ttl="COURSES_LIST_CACHE_TTL")
+    async def list_courses(self, filters=None, refresh: bool = False):
+        return await self.db.courses.find(filters or {}).to_list(50)
 
+    # Writes return None when the course doesn't exist
     async def update_course(self, course_id: str, update_data: dict):
         update_data = jsonable_encoder(update_data)
-        await self.db.courses.update_one({"_id": ObjectId(course_id)}, {"$set": update_data})
-        await self.invalidate_cache(f"course:{course_id}")
-        await self.invalidate_cache("courses_list:*")
+        result = await self.db.courses.update_one({"_id": ObjectId(course_id)}, {"$set": update_data})
+        await self._invalidate(course_id)
+        if result.matched_count == 0:
+            return None
         return {"message": "Course updated successfully"}
 
     async def update_module(self, course_id: str, module_id: str, update_data: dict):
@@ -49,16 +91,36 @@ class CourseService:
             {"_id": ObjectId(course_id), "modules.id": module_id},
             {"$set": {"modules.$": update_data}}
         )
-        await self.invalidate_cache(f"course:{course_id}")
-        await self.invalidate_cache("courses_list:*")
+        await self._invalidate(course_id)
         return {"message": "Module updated successfully"}
 
+    async def set_lesson_file(self, course_id: str, module_id: str, lesson_id: str, file_url: str):
+        result = await self.db.courses.update_one(
+            {"_id": ObjectId(course_id), "modules.id": module_id, "modules.lessons.id": lesson_id},
+            {"$set": {"modules.$[mod].lessons.$[les].file_url": file_url}},
+            array_filters=[{"mod.id": module_id}, {"les.id": lesson_id}]
+        )
+        await self._invalidate(course_id)
+        if result.matched_count == 0:
+            return None
+        return {"message": "File uploaded successfully", "file_url": file_url}
+
     async def delete_course(self, course_id: str):
-        await self.db.courses.delete_one({"_id": ObjectId(course_id)})
-        await self.invalidate_cache(f"course:{course_id}")
-        await self.invalidate_cache("courses_list:*")
+        result = await self.db.courses.delete_one({"_id": ObjectId(course_id)})
+        await self._invalidate(course_id)
+        if result.deleted_count == 0:
+            return None
         return {"message": "Course deleted successfully"}
 
+    # Invalidations are queued for replay while Redis is unavailable
+    async def _invalidate(self, course_id: str):
+        course_l1.delete(course_id)
+        await invalidate(self.redis, f"course:{course_id}", f"course_outline:{course_id}")
+        await self._invalidate_lists()
+
+    async def _invalidate_lists(self):
+        await run_or_defer(self.invalidate_cache, "courses_list:*", dedupe_key=("SCAN_DEL", "courses_list:*"))
+
     async def invalidate_cache(self, pattern: str):
         async for key in self.redis.scan_iter(pattern):
             await self.redis.delete(key)
@@ -0,0 +1,132 @@
+# app/services/course_stats_service.py
+
+import re
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app.models.progress import LESSON_ID_PATTERN
+from app.utils.config import settings
+
+RECONCILE_LOCK_KEY = "course_stats:reconcile_lock"
+
+
+class CourseStatsService:
+    """
+    course_stats materialized view, one document per course:
+
+        {_id: course_id, enrollments, completions, score_sum, score_count, time_sum,
+         lessons: {lesson_id: {completions, score_sum, score_count, time_sum}}}
+
+    `completions` counts completion events (retakes included), which is also the
+    number of quiz attempts recorded. Lesson ids that can't be used as field
+    names only count towards the course totals. Counters are $inc'd by the
+    progress write path; reconcile() rebuilds them from progress with $merge to
+    correct drift.
+    A course whose counters were $inc'd while the rebuild ran keeps them, and
+    is corrected by the next run.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def apply_deltas(self, deltas, enrolled=()):
+        """
+        deltas: iterable of (course_id, lesson_id, time_spent, quiz_scores, completed)
+        enrolled: course ids that gained a new progress document
+        """
+        increments = {}
+        for course_id, lesson_id, time_spent, scores, completed in deltas:
+            inc = increments.setdefault(course_id, {})
+            values = {
+                # One quiz score is recorded per completion event
+                "completions": len(scores) if completed else 0,
+                "score_sum": sum(scores),
+                "score_count": len(scores),
+                "time_sum": time_spent,
+            }
+            for field, value in values.items():
+                if not value:
+                    continue
+                inc[field] = inc.get(field, 0) + value
+                if not isinstance(lesson_id, str) or not re.match(LESSON_ID_PATTERN, lesson_id):
+                    continue
+                lesson_field = f"lessons.{lesson_id}.{field}"
+                inc[lesson_field] = inc.get(lesson_field, 0) + value
+        for course_id in enrolled:
+            inc = increments.setdefault(course_id, {})
+            inc["enrollments"] = inc.get("enrollments", 0) + 1
+
+        operations = [
+            UpdateOne({"_id": course_id}, {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}}, upsert=True)
+            for course_id, inc in increments.items() if inc
+        ]
+        if operations:
+            await self.db.course_stats.bulk_write(operations, ordered=False)
+
+    async def get(self, course_id: str):
+        return await self.db.course_stats.find_one({"_id": course_id})
+
+    async def scheduled_reconcile(self, redis_client):
+        """Periodic full reconcile; the SET NX lock lets one worker per interval run it."""
+        lock_seconds = max(1, int(settings.COURSE_STATS_RECONCILE_INTERVAL * 0.9))
+        if await redis_client.set(RECONCILE_LOCK_KEY, datetime.utcnow().isoformat(), nx=True, ex=lock_seconds):
+            await self.reconcile()
+
+    async def reconcile(self, course_id: str = None):
+        """Rebuild course_stats from the progress collection (all courses, or one)."""
+        started = datetime.utcnow()
+        score_sum = {"$ifNull": ["$lessons.quiz_summary.sum", {"$sum": "$lessons.quiz_scores"}]}
+        score_count = {"$ifNull": ["$lessons.quiz_summary.count", {"$size": {"$ifNull": ["$lessons.quiz_scores", []]}}]}
+
+        pipeline = [{"$match": {"course_id": course_id}}] if course_id else []
+        pipeline += [
+            # Keep docs without lessons so they still count as enrollments; the first
+            # unwound element of each doc carries its enrollment mark
+            {"$unwind": {"path": "$lessons", "includeArrayIndex": "lesson_index", "preserveNullAndEmptyArrays": True}},
+            {"$group": {
+                "_id": {"course_id": "$course_id", "lesson_id": "$lessons.lesson_id"},
+                "enrollments": {"$sum": {"$cond": [{"$gt": ["$lesson_index", 0]}, 0, 1]}},
+                "completions": {"$sum": score_count},
+                "score_sum": {"$sum": score_sum},
+                "score_count": {"$sum": score_count},
+                "time_sum": {"$sum": {"$ifNull": ["$lessons.time_spent_seconds", 0]}},
+            }},
+            {"$group": {
+                "_id": "$_id.course_id",
+                "enrollments": {"$sum": "$enrollments"},
+                "completions": {"$sum": "$completions"},
+                "score_sum": {"$sum": "$score_sum"},
+                "score_count": {"$sum": "$score_count"},
+                "time_sum": {"$sum": "$time_sum"},
+                "lessons": {"$push": {
+                    "k": "$_id.lesson_id",
+                    "v": {
+                        "completions": "$completions",
+                        "score_sum": "$score_sum",
+                        "score_count": "$score_count",
+                        "time_sum": "$time_sum",
+                    }
+                }},
+            }},
+            {"$set": {
+                "lessons": {"$arrayToObject": {"$filter": {
+                    "input": "$lessons",
+                    "cond": {"$regexMatch": {"input": {"$ifNull": ["$$this.k", ""]}, "regex": LESSON_ID_PATTERN}},
+                }}},
+                "updated_at": "$$NOW",
+                "reconciled_at": "$$NOW",
+            }},
+            # Only replace docs no $inc has touched since the aggregation started reading
+            {"$merge": {
+                "into": "course_stats",
+                "on": "_id",
+                "whenMatched": [{"$replaceWith": {"$cond": [
+                    {"$lt": [{"$ifNull": ["$updated_at", datetime.min]}, started]},
+                    "$$new",
+                    "$$ROOT",
+                ]}}],
+                "whenNotMatched": "insert",
+            }},
+        ]
+        await self.db.progress.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
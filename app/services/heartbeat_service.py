@@ -0,0 +1,109 @@
+# app/services/heartbeat_service.py
+
+import time
+import uuid
+from datetime import datetime
+
+from app.utils.config import settings
+from app.services.activity_service import ActivityService
+from app.services.progress_service import ProgressService
+from app.services.rollup_service import RollupService
+from app.utils.redis_breaker import invalidate, run_or_defer
+
+
+class HeartbeatService:
+    """
+    Time-on-lesson heartbeats.
+
+    Each beat is a single HINCRBY on progress_heartbeat:{user_id}:{course_id}
+    (field = lesson_id) plus an SADD to the dirty set; nothing touches Mongo.
+    flush() periodically folds the accumulated seconds into
+    progress.lessons.time_spent_seconds, one bulk_write per batch of
+    HEARTBEAT_FLUSH_BATCH (user, course) pairs, draining the dirty set until
+    it is empty or HEARTBEAT_FLUSH_BUDGET_SECONDS have passed.
+    """
+
+    DIRTY_KEY = "progress_heartbeat:dirty"
+
+    def __init__(self, db, redis_client):
+        self.db = db
+        self.redis = redis_client
+
+    @staticmethod
+    def _key(user_id: str, course_id: str) -> str:
+        return f"progress_heartbeat:{user_id}:{course_id}"
+
+    async def record_heartbeat(self, user_id: str, course_id: str, lesson_id: str, seconds: int):
+        seconds = max(0, min(seconds, settings.HEARTBEAT_MAX_SECONDS))
+        if not seconds:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self._key(user_id, course_id), lesson_id, seconds)
+            pipe.sadd(self.DIRTY_KEY, f"{user_id}:{course_id}")
+            await pipe.execute()
+
+    async def flush(self, batch_size: int = None) -> int:
+        """Move accumulated heartbeat seconds into Mongo. Returns the number of (user, course) pairs flushed."""
+        batch_size = batch_size or settings.HEARTBEAT_FLUSH_BATCH
+        deadline = time.monotonic() + settings.HEARTBEAT_FLUSH_BUDGET_SECONDS
+        flushed = 0
+        while True:
+            popped, pairs = await self._flush_batch(batch_size)
+            flushed += pairs
+            if popped < batch_size or time.monotonic() >= deadline:
+                return flushed
+
+    async def _flush_batch(self, batch_size: int):
+        """Flush up to batch_size dirty pairs; returns (pairs popped, pairs flushed)."""
+        members = await self.redis.spop(self.DIRTY_KEY, batch_size)
+        if not members:
+            return 0, 0
+
+        # Read-and-reset each hash atomically so beats arriving mid-flush go to the next cycle
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for member in members:
+                user_id, course_id = member.split(":", 1)
+                pipe.hgetall(self._key(user_id, course_id))
+                pipe.delete(self._key(user_id, course_id))
+            results = await pipe.execute()
+
+        pending = {}
+        deltas = []
+        for member, totals in zip(members, results[::2]):
+            if not totals:
+                continue
+            user_id, course_id = member.split(":", 1)
+            pending[(user_id, course_id)] = totals
+            for lesson_id, seconds in totals.items():
+                deltas.append((user_id, course_id, lesson_id, int(seconds), [], False))
+
+        if not deltas:
+            return len(members), 0
+
+        now = datetime.utcnow()  # explicit, so a deferred replay lands on the right day
+        op_id = uuid.uuid4().hex
+        try:
+            await ProgressService(self.db, self.redis).write_lesson_deltas(deltas, op_id)
+        except Exception:
+            # Put the seconds back so the next cycle retries them
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for (user_id, course_id), totals in pending.items():
+                    for lesson_id, seconds in totals.items():
+                        pipe.hincrby(self._key(user_id, course_id), lesson_id, int(seconds))
+                    pipe.sadd(self.DIRTY_KEY, f"{user_id}:{course_id}")
+                await pipe.execute()
+            raise
+
+        # Progress is written: Redis-side follow-ups are replayed later if Redis is unavailable
+        await run_or_defer(RollupService(self.db, self.redis).record, [
+            (user_id, course_id, now, time_spent, [], False)
+            for user_id, course_id, _, time_spent, _, _ in deltas
+        ], op_id)
+
+        stale_keys = {k for user_id, course_id in pending for k in ProgressService._cache_keys(user_id, course_id)}
+        await invalidate(self.redis, *stale_keys)
+
+        activity = ActivityService(self.redis)
+        await run_or_defer(activity.record_many, {user_id: [now] for user_id, _ in pending})
+        await run_or_defer(activity.count_learners, [(user_id, course_id, now) for user_id, course_id in pending])
+        return len(members), len(pending)
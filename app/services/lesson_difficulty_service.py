@@ -0,0 +1,266 @@
+# app/services/lesson_difficulty_service.py
+
+import uuid
+
+from bson import ObjectId
+
+from app.utils.config import settings
+from app.utils import codec
+from app.utils.cache import cached
+from app.services.activity_service import ActivityService
+from app.utils.redis_breaker import apply_once
+
+
+class LessonDifficultyService:
+    """
+    Per-lesson difficulty maintained incrementally on every progress write.
+
+    Keys:
+    - lesson_difficulty:{course_id}                     sorted set, lesson_id -> difficulty (0..1)
+    - lesson_difficulty:stats:{course_id}:{lesson_id}   hash of counters
+    - lesson_difficulty:started:{course_id}:{lesson_id}   bitmap of learners who touched the lesson
+    - lesson_difficulty:completed:{course_id}:{lesson_id} bitmap of learners who completed it
+    - course_outline:{course_id}                        cached [[module_id, lesson_id], ...]
+
+    Bitmaps are indexed by ActivityService.user_index, so first-time starters and
+    completers are detected with the previous bit returned by SETBIT.
+
+    Difficulty is a weighted sum of four signals, each scaled to 0..1:
+    - score_gap:  1 - avg quiz score / QUIZ_SCORE_MAX
+    - retry_rate: completions beyond a learner's first / completions
+    - time:       avg time / (avg time + LESSON_DIFFICULTY_TIME_SCALE)
+    - drop_off:   1 - learners starting the next lesson / learners completing this one
+    """
+
+    WEIGHTS = {"score_gap": 0.35, "retry_rate": 0.25, "time": 0.15, "drop_off": 0.25}
+
+    def __init__(self, db, redis_client):
+        self.db = db
+        self.redis = redis_client
+        self.activity = ActivityService(redis_client)
+
+    # ---------- Keys ----------
+    @staticmethod
+    def _rank_key(course_id: str) -> str:
+        return f"lesson_difficulty:{course_id}"
+
+    @staticmethod
+    def _stats_key(course_id: str, lesson_id: str) -> str:
+        return f"lesson_difficulty:stats:{course_id}:{lesson_id}"
+
+    @staticmethod
+    def started_key(course_id: str, lesson_id: str) -> str:
+        return f"lesson_difficulty:started:{course_id}:{lesson_id}"
+
+    @staticmethod
+    def completed_key(course_id: str, lesson_id: str) -> str:
+        return f"lesson_difficulty:completed:{course_id}:{lesson_id}"
+
+    # ---------- Course outline ----------
+    @cached("course_outline:{course_id}", ttl="COURSE_OUTLINE_TTL")
+    async def outline(self, course_id: str) -> list:
+        """Ordered [module_id, lesson_id] pairs for a course (empty if unknown); id-less entries are skipped."""
+        course = None
+        if ObjectId.is_valid(course_id):
+            course = await self.db.courses.find_one(
+                {"_id": ObjectId(course_id)}, {"modules.id": 1, "modules.lessons.id": 1}
+            )
+        outline = [
+            [str(module["id"]), str(lesson["id"])]
+            for module in (course or {}).get("modules") or []
+            if module.get("id") is not None
+            for lesson in module.get("lessons") or []
+            if lesson.get("id") is not None
+        ]
+        return outline
+
+    async def outlines(self, course_ids) -> dict:
+        """outline() for many courses: one MGET of the cached outlines, computing only the misses."""
+        course_ids = list(dict.fromkeys(course_ids))
+        cached_outlines = await codec.mget(self.redis, [f"course_outline:{c}" for c in course_ids])
+        outlines = {}
+        for course_id, outline in zip(course_ids, cached_outlines):
+            outlines[course_id] = outline if isinstance(outline, list) else await self.outline(course_id)
+        return outlines
+
+    # ---------- Writes ----------
+    async def record(self, deltas, op_id: str = None):
+        """
+        deltas: iterable of (user_id, course_id, lesson_id, time_spent, quiz_scores, completed)
+
+        Returns the first-time transitions in the batch as
+        (user_id, course_id, lesson_id, first_start, first_completion).
+        Bits and counters go through apply_once, so replaying the same op_id
+        reports the same transitions and doesn't count anything twice.
+        """
+        deltas = list(deltas)
+        if not deltas:
+            return []
+        op_id = op_id or uuid.uuid4().hex
+        indexes = await self.activity.user_indexes(d[0] for d in deltas)
+
+        bits = []
+        for user_id, course_id, lesson_id, _, _, completed in deltas:
+            bits.append(("SETBIT", self.started_key(course_id, lesson_id), indexes[user_id], 1))
+            if completed:
+                bits.append(("SETBIT", self.completed_key(course_id, lesson_id), indexes[user_id], 1))
+            else:
+                bits.append(("GETBIT", self.completed_key(course_id, lesson_id), indexes[user_id]))
+        previous = await apply_once(self.redis, op_id, "lesson_difficulty:bits", bits)
+
+        transitions, increments = [], []
+        for i, (user_id, course_id, lesson_id, time_spent, scores, completed) in enumerate(deltas):
+            first_start = not previous[2 * i]
+            first_completion = bool(completed and not previous[2 * i + 1])
+            if first_start or first_completion:
+                transitions.append((user_id, course_id, lesson_id, first_start, first_completion))
+            counters = {
+                "starters": 1 if first_start else 0,
+                "completers": 1 if first_completion else 0,
+                "completions": 1 if completed else 0,
+                "attempts": len(scores),
+                "score_sum": sum(scores),
+                "time_sum": time_spent,
+            }
+            for field, value in counters.items():
+                if value:
+                    increments.append(("HINCRBY", self._stats_key(course_id, lesson_id), field, value))
+        await apply_once(self.redis, op_id, "lesson_difficulty:stats", increments)
+
+        touched = {}
+        for _, course_id, lesson_id, _, _, _ in deltas:
+            touched.setdefault(course_id, set()).add(lesson_id)
+        await self._rescore(touched)
+        return transitions
+
+    async def _rescore(self, touched: dict):
+        """touched: course_id -> lesson ids whose counters changed. One HGETALL pipeline and one ZADD pipeline."""
+        outlines = await self.outlines(touched)
+        plans = []
+        for course_id, lesson_ids in touched.items():
+            order = [lesson_id for _, lesson_id in outlines[course_id]]
+            position = {lesson_id: i for i, lesson_id in enumerate(order)}
+
+            def neighbour(lesson_id, step):
+                i = position.get(lesson_id)
+                if i is None or not 0 <= i + step < len(order):
+                    return None
+                return order[i + step]
+
+            # New starters of a lesson change the drop-off of the lesson before it
+            rescore = set(lesson_ids) | {neighbour(l, -1) for l in lesson_ids} - {None}
+            next_of = {lesson_id: neighbour(lesson_id, 1) for lesson_id in rescore}
+            needed = sorted(rescore | set(next_of.values()) - {None})
+            plans.append((course_id, next_of, needed))
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for course_id, _, needed in plans:
+                for lesson_id in needed:
+                    pipe.hgetall(self._stats_key(course_id, lesson_id))
+            rows = iter(await pipe.execute())
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for course_id, next_of, needed in plans:
+                stats = {lesson_id: {f: int(v) for f, v in next(rows).items()} for lesson_id in needed}
+                pipe.zadd(self._rank_key(course_id), {
+                    lesson_id: self._signals(stats[lesson_id], stats.get(following))["difficulty"]
+                    for lesson_id, following in next_of.items()
+                })
+            await pipe.execute()
+
+    async def _stats(self, course_id: str, lesson_ids) -> list:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for lesson_id in lesson_ids:
+                pipe.hgetall(self._stats_key(course_id, lesson_id))
+            rows = await pipe.execute()
+        return [{field: int(value) for field, value in row.items()} for row in rows]
+
+    def _signals(self, stats: dict, next_stats: dict = None) -> dict:
+        starters = stats.get("starters", 0)
+        completers = stats.get("completers", 0)
+        completions = stats.get("completions", 0)
+        attempts = stats.get("attempts", 0)
+
+        avg_score = stats.get("score_sum", 0) / attempts if attempts else 0
+        avg_time = stats.get("time_sum", 0) / starters if starters else 0
+        retry_rate = max(0, completions - completers) / completions if completions else 0
+        drop_off = 0
+        if next_stats is not None and completers:
+            drop_off = 1 - min(1, next_stats.get("starters", 0) / completers)
+
+        components = {
+            "score_gap": 1 - avg_score / settings.QUIZ_SCORE_MAX if attempts else 0,
+            "retry_rate": retry_rate,
+            "time": avg_time / (avg_time + settings.LESSON_DIFFICULTY_TIME_SCALE) if avg_time else 0,
+            "drop_off": drop_off,
+        }
+        return {
+            "difficulty": round(sum(self.WEIGHTS[k] * v for k, v in components.items()), 4),
+            "learners": starters,
+            "avg_score": avg_score,
+            "retry_rate": retry_rate,
+            "avg_time_spent": avg_time,
+            "drop_off_rate": drop_off,
+        }
+
+    # ---------- Reads ----------
+    async def most_difficult(self, course_id: str, limit: int = None) -> list:
+        limit = limit or settings.LESSON_DIFFICULTY_TOP_K
+        ranked = await self.redis.zrevrange(self._rank_key(course_id), 0, limit - 1, withscores=True)
+        if not ranked:
+            return []
+
+        outline = await self.outline(course_id)
+        order = [lesson_id for _, lesson_id in outline]
+        modules = {lesson_id: module_id for module_id, lesson_id in outline}
+        next_lesson = dict(zip(order, order[1:]))
+
+        lesson_ids = [lesson_id for lesson_id, _ in ranked]
+        needed = sorted(set(lesson_ids) | {next_lesson[l] for l in lesson_ids if l in next_lesson})
+        stats = dict(zip(needed, await self._stats(course_id, needed)))
+
+        lessons = []
+        for lesson_id, score in ranked:
+            signals = self._signals(stats[lesson_id], stats.get(next_lesson.get(lesson_id)))
+            signals["difficulty"] = score
+            lessons.append({"lesson_id": lesson_id, "module_id": modules.get(lesson_id), **signals})
+        return lessons
+
+    async def completion_by_module(self, course_id: str) -> dict:
+        """
+        Percentage of the course's learners who completed every lesson of each
+        module: BITOP AND over the module's completion bitmaps, divided by the
+        BITOP OR of all lesson start bitmaps.
+        """
+        outline = await self.outline(course_id)
+        if not outline:
+            return {}
+        modules = {}
+        for module_id, lesson_id in outline:
+            modules.setdefault(module_id, []).append(lesson_id)
+
+        prefix = f"lesson_difficulty:tmp:{uuid.uuid4().hex}"
+        learners_key = f"{prefix}:learners"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.bitop("OR", learners_key, *[self.started_key(course_id, l) for _, l in outline])
+            pipe.bitcount(learners_key)
+            pipe.delete(learners_key)
+            for module_id, lesson_ids in modules.items():
+                module_key = f"{prefix}:{module_id}"
+                pipe.bitop("AND", module_key, *[self.completed_key(course_id, l) for l in lesson_ids])
+                pipe.bitcount(module_key)
+                pipe.delete(module_key)
+            results = await pipe.execute()
+
+        learners = results[1]
+        return {
+            module_id: round(100 * results[3 * i + 4] / learners, 1) if learners else 0.0
+            for i, module_id in enumerate(modules)
+        }
+
+    async def summary(self, course_id: str, limit: int = None) -> dict:
+        return {
+            "course_id": course_id,
+            "most_difficult_lessons": await self.most_difficult(course_id, limit),
+            "completion_by_module": await self.completion_by_module(course_id),
+        }
@@ -0,0 +1,139 @@
+# app/services/live_service.py
+
+import asyncio
+import json
+import logging
+import re
+from datetime import datetime
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOPIC_PATTERN = re.compile(r"^(user|course):[\w\-]+$")
+
+
+def topic_channel(topic: str) -> str:
+    return f"live:{topic}"
+
+
+async def publish_progress_updates(redis_client, updates):
+    """
+    Publish progress deltas to the live:user:{id} and live:course:{id} channels.
+    `updates` is an iterable of dicts carrying at least user_id and course_id.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for update in updates:
+            message = json.dumps({**update, "at": datetime.utcnow().isoformat()})
+            pipe.publish(topic_channel(f"user:{update['user_id']}"), message)
+            pipe.publish(topic_channel(f"course:{update['course_id']}"), message)
+        await pipe.execute()
+
+
+class Subscription:
+    """One connected client. The queue is bounded; when it is full the oldest message is dropped."""
+
+    __slots__ = ("topics", "queue", "dropped")
+
+    def __init__(self, topics, maxsize: int):
+        self.topics = set(topics)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, data: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(data)
+
+
+class LiveHub:
+    """
+    Per-worker fan-out. A single Redis pub/sub connection is shared by every
+    SSE/WebSocket client on the worker; channels are subscribed on first use
+    and released when their last local subscriber leaves.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.pubsub = None
+        self._reader = None
+        self._subscribers = {}  # channel -> set[Subscription]
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, redis_client, topics) -> Subscription:
+        subscription = Subscription(topics, settings.LIVE_QUEUE_SIZE)
+        await self.add_topics(redis_client, subscription, topics)
+        return subscription
+
+    async def add_topics(self, redis_client, subscription: Subscription, topics):
+        async with self._lock:
+            if self.pubsub is None:
+                self.redis = redis_client
+                self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            new_channels = []
+            for topic in topics:
+                channel = topic_channel(topic)
+                subscribers = self._subscribers.setdefault(channel, set())
+                if not subscribers:
+                    new_channels.append(channel)
+                subscribers.add(subscription)
+                subscription.topics.add(topic)
+            if new_channels:
+                await self.pubsub.subscribe(*new_channels)
+            if self._reader is None:
+                self._reader = asyncio.create_task(self._read_loop(), name="live-hub-reader")
+
+    async def remove_topics(self, subscription: Subscription, topics):
+        async with self._lock:
+            released = []
+            for topic in topics:
+                channel = topic_channel(topic)
+                subscribers = self._subscribers.get(channel)
+                subscription.topics.discard(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+                    released.append(channel)
+            if released and self.pubsub is not None:
+                await self.pubsub.unsubscribe(*released)
+
+    async def unsubscribe(self, subscription: Subscription):
+        await self.remove_topics(subscription, list(subscription.topics))
+
+    async def _read_loop(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live hub lost its pub/sub connection, retrying")
+                await asyncio.sleep(1)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            # The same string object is handed to every subscriber, nothing is copied per client
+            for subscription in tuple(self._subscribers.get(message["channel"], ())):
+                subscription.push(message["data"])
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._subscribers),
+            "subscriptions": sum(len(s) for s in self._subscribers.values()),
+        }
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self.pubsub is not None:
+            await self.pubsub.close()
+            self.pubsub = None
+        self._subscribers.clear()
+
+
+live_hub = LiveHub()
@@ -0,0 +1,208 @@
+# app/services/module_funnel_service.py
+
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.utils.config import settings
+from app.services.activity_service import ActivityService
+from app.services.lesson_difficulty_service import LessonDifficultyService
+from app.utils.redis_breaker import op_key
+
+# HINCRBY only while the cached funnel exists, so an expired funnel is never
+# resurrected as a partial hash; the next read rebuilds it from progress.
+# KEYS[2]/ARGV[1..2] are the op hash, its ttl and step (see redis_breaker.apply_once):
+# a replayed op is not applied twice.
+_APPLY_SCRIPT = """
+if redis.call('hsetnx', KEYS[2], ARGV[2], 1) == 0 then
+    return 0
+end
+redis.call('expire', KEYS[2], ARGV[1])
+if redis.call('exists', KEYS[1]) == 1 then
+    for i = 3, #ARGV, 2 do
+        redis.call('hincrby', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    return 1
+end
+return 0
+"""
+
+
+class ModuleFunnelService:
+    """
+    Module completion funnel per course: learners who started and who finished
+    each module, in course order.
+
+    Cached as a hash under analytics:course:{course_id}:funnel with fields
+    `learners`, `{module_id}:started` and `{module_id}:completed`. It is built by
+    one aggregation joining progress with the course outline and then kept
+    current by the progress write path from the lesson start/completion
+    transitions reported by LessonDifficultyService.
+    """
+
+    def __init__(self, db, redis_client):
+        self.db = db
+        self.redis = redis_client
+        self.lessons = LessonDifficultyService(db, redis_client)
+        self.activity = ActivityService(redis_client)
+
+    @staticmethod
+    def _key(course_id: str) -> str:
+        return f"analytics:course:{course_id}:funnel"
+
+    # ---------- Build ----------
+    async def _aggregate(self, course_id: str) -> dict:
+        if not ObjectId.is_valid(course_id):
+            return {"learners": 0}
+        lessons = {"$ifNull": ["$lessons", []]}
+        pipeline = [
+            {"$match": {"course_id": course_id}},
+            {"$project": {
+                "touched": {"$map": {"input": lessons, "in": "$$this.lesson_id"}},
+                "done": {"$map": {
+                    "input": {"$filter": {"input": lessons, "cond": "$$this.completed"}},
+                    "in": "$$this.lesson_id",
+                }},
+            }},
+            {"$facet": {
+                "learners": [{"$count": "n"}],
+                "modules": [
+                    {"$lookup": {
+                        "from": "courses",
+                        "pipeline": [
+                            {"$match": {"_id": ObjectId(course_id)}},
+                            # Modules without an id aren't funnel stages (see LessonDifficultyService.outline)
+                            {"$project": {"modules": {"$map": {
+                                "input": {"$filter": {
+                                    "input": {"$ifNull": ["$modules", []]},
+                                    "cond": {"$ne": [{"$ifNull": ["$$this.id", None]}, None]},
+                                }},
+                                "in": {"id": "$$this.id", "lessons": {"$ifNull": ["$$this.lessons.id", []]}},
+                            }}}},
+                        ],
+                        "as": "course",
+                    }},
+                    {"$unwind": "$course"},
+                    {"$unwind": "$course.modules"},
+                    {"$group": {
+                        "_id": "$course.modules.id",
+                        "started": {"$sum": {"$cond": [
+                            {"$gt": [{"$size": {"$setIntersection": ["$touched", "$course.modules.lessons"]}}, 0]}, 1, 0
+                        ]}},
+                        "completed": {"$sum": {"$cond": [
+                            {"$and": [
+                                {"$gt": [{"$size": "$course.modules.lessons"}, 0]},
+                                {"$setIsSubset": ["$course.modules.lessons", "$done"]},
+                            ]}, 1, 0
+                        ]}},
+                    }},
+                ],
+            }},
+        ]
+        result = (await self.db.progress.aggregate(pipeline).to_list(length=1))[0]
+        counts = {"learners": result["learners"][0]["n"] if result["learners"] else 0}
+        for row in result["modules"]:
+            counts[f"{row['_id']}:started"] = row["started"]
+            counts[f"{row['_id']}:completed"] = row["completed"]
+        return counts
+
+    async def _load(self, course_id: str, refresh: bool = False) -> dict:
+        key = self._key(course_id)
+        cached = None if refresh else await self.redis.hgetall(key)
+        if cached:
+            return cached
+        counts = await self._aggregate(course_id)
+        counts["built_at"] = datetime.utcnow().isoformat()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=counts)
+            pipe.expire(key, settings.ANALYTICS_COURSE_TTL)
+            await pipe.execute()
+        return counts
+
+    async def funnel(self, course_id: str, refresh: bool = False) -> dict:
+        counts = await self._load(course_id, refresh)
+        outline = await self.lessons.outline(course_id)
+        learners = int(counts.get("learners", 0))
+
+        stages, previous = [], learners
+        for position, module_id in enumerate(dict.fromkeys(m for m, _ in outline)):
+            started = int(counts.get(f"{module_id}:started", 0))
+            completed = int(counts.get(f"{module_id}:completed", 0))
+            stages.append({
+                "module_id": module_id,
+                "position": position,
+                "started": started,
+                "completed": completed,
+                "completion_rate": round(100 * completed / started, 1) if started else 0.0,
+                "drop_off_rate": round(100 * (1 - min(1, started / previous)), 1) if previous else 0.0,
+            })
+            previous = completed
+        return {"course_id": course_id, "learners": learners, "stages": stages, "last_cached": counts["built_at"]}
+
+    # ---------- Incremental updates ----------
+    async def apply(self, transitions, enrolled=(), op_id: str = None):
+        """
+        transitions: (user_id, course_id, lesson_id, first_start, first_completion)
+        as returned by LessonDifficultyService.record; enrolled: course ids that
+        gained a learner.
+
+        A module is newly started when every lesson the learner has started in
+        it was first started in this batch, and newly completed when all of
+        its lessons are now complete and at least one was completed in this batch.
+        """
+        increments = {}
+        for course_id in enrolled:
+            inc = increments.setdefault(course_id, {})
+            inc["learners"] = inc.get("learners", 0) + 1
+
+        groups = {}
+        for user_id, course_id, lesson_id, first_start, first_completion in transitions:
+            group = groups.setdefault((user_id, course_id), (set(), set()))
+            if first_start:
+                group[0].add(lesson_id)
+            if first_completion:
+                group[1].add(lesson_id)
+
+        checks = []
+        outlines = await self.lessons.outlines(course_id for _, course_id in groups)
+        for (user_id, course_id), (started, completed) in groups.items():
+            modules = {}
+            for module_id, lesson_id in outlines[course_id]:
+                modules.setdefault(module_id, []).append(lesson_id)
+            for module_id, lesson_ids in modules.items():
+                if started.intersection(lesson_ids) or completed.intersection(lesson_ids):
+                    checks.append((user_id, course_id, module_id, lesson_ids, started, completed))
+
+        if checks:
+            indexes = await self.activity.user_indexes(c[0] for c in checks)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id, course_id, _, lesson_ids, _, _ in checks:
+                    for lesson_id in lesson_ids:
+                        pipe.getbit(self.lessons.started_key(course_id, lesson_id), indexes[user_id])
+                        pipe.getbit(self.lessons.completed_key(course_id, lesson_id), indexes[user_id])
+                bits = iter(await pipe.execute())
+
+            for user_id, course_id, module_id, lesson_ids, started, completed in checks:
+                state = [(next(bits), next(bits)) for _ in lesson_ids]
+                inc = increments.setdefault(course_id, {})
+                newly_started = started.intersection(lesson_ids)
+                if newly_started and all(
+                    lesson_id in newly_started or not is_started
+                    for lesson_id, (is_started, _) in zip(lesson_ids, state)
+                ):
+                    field = f"{module_id}:started"
+                    inc[field] = inc.get(field, 0) + 1
+                if completed.intersection(lesson_ids) and all(is_completed for _, is_completed in state):
+                    field = f"{module_id}:completed"
+                    inc[field] = inc.get(field, 0) + 1
+
+        op_id = op_id or uuid.uuid4().hex
+        for course_id, inc in increments.items():
+            if inc:
+                args = [value for field, amount in inc.items() for value in (field, amount)]
+                await self.redis.eval(
+                    _APPLY_SCRIPT, 2, self._key(course_id), op_key(op_id),
+                    settings.REDIS_REPLAY_OP_TTL, f"funnel:{course_id}", *args
+                )
@@ -1,46 +1,291 @@
 # app/services/progress_service.py
 
-from app.utils.cache import invalidate_cache
+import logging
+import uuid
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.utils.config import settings
+from app.services.activity_service import ActivityService
+from app.services.live_service import publish_progress_updates
+from app.services.course_stats_service import CourseStatsService
+from app.services.rollup_service import RollupService
+from app.services.score_distribution_service import ScoreDistributionService
+from app.services.lesson_difficulty_service import LessonDifficultyService
+from app.services.module_funnel_service import ModuleFunnelService
+from app.utils.redis_breaker import invalidate, run_or_defer
+
+logger = logging.getLogger(__name__)
+
+# SADD each event id on its own so the reply says which ids this request claimed
+_CLAIM_SCRIPT = """
+local claimed = {}
+for i = 2, #ARGV do
+    claimed[#claimed + 1] = redis.call('sadd', KEYS[1], ARGV[i])
+end
+redis.call('expire', KEYS[1], ARGV[1])
+return claimed
+"""
+
+
+def _nothing_written(exc: Exception) -> bool:
+    """True if a failed progress bulk_write is known to have applied no operation."""
+    if isinstance(exc, ServerSelectionTimeoutError):
+        return True  # no server was reached
+    if isinstance(exc, BulkWriteError):
+        details = exc.details
+        return not (details.get("nInserted") or details.get("nModified") or details.get("nUpserted"))
+    return False
 
 
 class ProgressService:
     def __init__(self, db, redis_client):
         self.db = db
         self.redis = redis_client
+        self.activity = ActivityService(redis_client)
+        self.course_stats = CourseStatsService(db)
+        self.rollups = RollupService(db, redis_client)
+        self.score_distribution = ScoreDistributionService(redis_client)
+        self.difficulty = LessonDifficultyService(db, redis_client)
+        self.funnel = ModuleFunnelService(db, redis_client)
+
+    @staticmethod
+    def _cache_keys(user_id: str, course_id: str):
+        # Every cache entry derived from a user's progress in a course
+        return [
+            f"progress:{user_id}:{course_id}",
+            f"course:{course_id}:user:{user_id}",
+            f"user_dashboard:{user_id}",
+            f"user:{user_id}:dashboard",
+        ]
+
+    @staticmethod
+    def _lesson_operations(user_id: str, course_id: str, lesson_id: str, time_spent: int = 0,
+                           quiz_scores=(), completed: bool = True):
+        """
+        Ordered bulk ops applying one lesson delta atomically:
+        make sure the progress doc exists, seed a legacy lesson's quiz_summary,
+        update the lesson in place if present, otherwise push it. Quiz attempts
+        update running summary fields (count/sum/min/max/last/best) and a
+        capped recent-history array.
+        """
+        doc_filter = {"user_id": user_id, "course_id": course_id}
+        scores = list(quiz_scores)
+        history = settings.QUIZ_SCORE_HISTORY_SIZE
+
+        update = {"$inc": {"lessons.$.time_spent_seconds": time_spent}}
+        if completed:
+            update["$set"] = {"lessons.$.completed": True}
+        new_lesson = {
+            "lesson_id": lesson_id,
+            "completed": completed,
+            "time_spent_seconds": time_spent,
+            "quiz_scores": scores[-history:],
+        }
+
+        if scores:
+            update.setdefault("$set", {})["lessons.$.quiz_summary.last"] = scores[-1]
+            update["$inc"]["lessons.$.quiz_summary.count"] = len(scores)
+            update["$inc"]["lessons.$.quiz_summary.sum"] = sum(scores)
+            update["$min"] = {"lessons.$.quiz_summary.min": min(scores)}
+            update["$max"] = {"lessons.$.quiz_summary.max": max(scores), "lessons.$.quiz_summary.best": max(scores)}
+            update["$push"] = {"lessons.$.quiz_scores": {"$each": scores, "$slice": -history}}
+            new_lesson["quiz_summary"] = {
+                "count": len(scores),
+                "sum": sum(scores),
+                "min": min(scores),
+                "max": max(scores),
+                "last": scores[-1],
+                "best": max(scores),
+            }
+
+        operations = [UpdateOne(doc_filter, {"$setOnInsert": {"lessons": []}}, upsert=True)]
+        if scores:
+            operations.append(ProgressService._seed_quiz_summary(doc_filter, lesson_id))
+        return operations + [
+            UpdateOne({**doc_filter, "lessons.lesson_id": lesson_id}, update),
+            UpdateOne(
+                {**doc_filter, "lessons.lesson_id": {"$ne": lesson_id}},
+                {"$push": {"lessons": new_lesson}}
+            ),
+        ]
+
+    @staticmethod
+    def _seed_quiz_summary(doc_filter: dict, lesson_id: str) -> UpdateOne:
+        """
+        Lessons written before quiz_summary existed only have quiz_scores:
+        build the summary from them first, so the $inc/$min/$max that follow
+        add to every earlier attempt instead of starting from zero.
+        """
+        scores = {"$ifNull": ["$$this.quiz_scores", []]}
+        return UpdateOne(
+            {**doc_filter, "lessons": {"$elemMatch": {
+                "lesson_id": lesson_id, "quiz_summary": None, "quiz_scores.0": {"$exists": True}
+            }}},
+            [{"$set": {"lessons": {"$map": {"input": "$lessons", "in": {"$cond": [
+                {"$and": [
+                    {"$eq": ["$$this.lesson_id", lesson_id]},
+                    {"$eq": [{"$ifNull": ["$$this.quiz_summary", None]}, None]},
+                    {"$gt": [{"$size": scores}, 0]},
+                ]},
+                {"$mergeObjects": ["$$this", {"quiz_summary": {
+                    "count": {"$size": scores},
+                    "sum": {"$sum": scores},
+                    "min": {"$min": scores},
+                    "max": {"$max": scores},
+                    "last": {"$arrayElemAt": [scores, -1]},
+                    "best": {"$max": scores},
+                }}]},
+                "$$this",
+            ]}}}}}]
+        )
+
+    async def write_lesson_deltas(self, deltas, op_id: str = None):
+        """
+        Apply lesson deltas in one ordered bulk_write and roll them into course_stats.
+        deltas: list of (user_id, course_id, lesson_id, time_spent, quiz_scores, completed)
+        op_id keys the Redis counter updates, so deferred replays apply them once.
+        """
+        op_id = op_id or uuid.uuid4().hex
+        operations, enrollment_ops = [], {}
+        for user_id, course_id, lesson_id, time_spent, scores, completed in deltas:
+            # The first op of each group is the $setOnInsert upsert that creates the doc
+            enrollment_ops[len(operations)] = course_id
+            operations.extend(self._lesson_operations(
+                user_id, course_id, lesson_id, time_spent, scores, completed
+            ))
+        result = await self.db.progress.bulk_write(operations, ordered=True)
+
+        enrolled = [enrollment_ops[i] for i in result.upserted_ids if i in enrollment_ops]
+        try:
+            await self.course_stats.apply_deltas(
+                [(course_id, lesson_id, time_spent, scores, completed)
+                 for _, course_id, lesson_id, time_spent, scores, completed in deltas],
+                enrolled
+            )
+        except Exception:
+            # Progress is already written; the periodic reconcile repairs course_stats
+            logger.exception("course_stats update failed")
+        # Redis-side aggregates: replayed later if Redis is unavailable
+        try:
+            await run_or_defer(self._record_difficulty, deltas, enrolled, op_id)
+        except Exception:
+            logger.exception("lesson difficulty / funnel update failed")
+        try:
+            await run_or_defer(
+                self.score_distribution.record,
+                [(course_id, lesson_id, scores) for _, course_id, lesson_id, _, scores, _ in deltas],
+                op_id
+            )
+        except Exception:
+            logger.exception("score distribution update failed")
+
+    async def _record_difficulty(self, deltas, enrolled, op_id):
+        transitions = await self.difficulty.record(deltas, op_id)
+        await self.funnel.apply(transitions, enrolled, op_id)
+
+    async def _publish(self, updates):
+        # Live updates only matter now; they are dropped while Redis is unavailable
+        try:
+            await publish_progress_updates(self.redis, updates)
+        except (ConnectionError, TimeoutError):
+            logger.warning("Skipped %d live progress updates, Redis unavailable", len(updates))
 
     async def update_lesson_progress(self, user_id: str, course_id: str, lesson_id: str, time_spent: int,
                                      quiz_score: int):
-        # Check if a progress doc already exists
-        progress_doc = await self.db.progress.find_one({"user_id": user_id, "course_id": course_id})
-
-        if not progress_doc:
-            progress_doc = {"user_id": user_id, "course_id": course_id, "lessons": []}
-
-        # Check if this lesson already exists in progress
-        lesson_found = False
-        for l in progress_doc["lessons"]:
-            if l["lesson_id"] == lesson_id:
-                l["completed"] = True
-                l["time_spent_seconds"] = l.get("time_spent_seconds", 0) + time_spent
-                l.setdefault("quiz_scores", []).append(quiz_score)
-                lesson_found = True
-                break
-
-        if not lesson_found:
-            progress_doc["lessons"].append({
-                "lesson_id": lesson_id,
-                "completed": True,
-                "time_spent_seconds": time_spent,
-                "quiz_scores": [quiz_score]
-            })
-
-        # Update DB (upsert if doesn't exist)
-        await self.db.progress.update_one(
-            {"user_id": user_id, "course_id": course_id},
-            {"$set": progress_doc},
-            upsert=True
-        )
+        now = datetime.utcnow()  # explicit, so a deferred replay lands on the right day
+        op_id = uuid.uuid4().hex
+        await self.write_lesson_deltas([(user_id, course_id, lesson_id, time_spent, [quiz_score], True)], op_id)
+        await run_or_defer(self.rollups.record, [(user_id, course_id, now, time_spent, [quiz_score], True)], op_id)
 
         # Invalidate both user dashboard & specific course cache
-        invalidate_cache(self.redis, f"progress:{user_id}:{course_id}")
-        invalidate_cache(self.redis, f"user_dashboard:{user_id}")
+        await invalidate(self.redis, *self._cache_keys(user_id, course_id))
+        await run_or_defer(self.activity.record_activities, user_id, [now])
+        await run_or_defer(self.activity.count_learners, [(user_id, course_id, now)])
+        await self._publish([{
+            "type": "lesson_completed",
+            "user_id": user_id,
+            "course_id": course_id,
+            "lesson_id": lesson_id,
+            "time_spent": time_spent,
+            "quiz_score": quiz_score,
+        }])
+
+    async def sync_progress_events(self, user_id: str, events: list):
+        """
+        Apply a batch of offline progress events (ProgressEvent models).
+        Events are merged per course and lesson in memory and written with one
+        bulk_write. Event ids are claimed in Redis before the write, so a retry
+        racing the original request skips them; they are released only if the
+        write failed without applying anything.
+        """
+        dedup_key = f"progress_sync:{user_id}"
+
+        # Drop ids repeated inside the batch, then claim the rest; ids claimed
+        # by earlier (or concurrent) syncs are skipped
+        unique_events = {}
+        for event in events:
+            unique_events.setdefault(event.event_id, event)
+        event_ids = list(unique_events)
+        claimed = await self.redis.eval(
+            _CLAIM_SCRIPT, 1, dedup_key, settings.PROGRESS_SYNC_DEDUP_TTL, *event_ids
+        ) if event_ids else []
+        fresh = [unique_events[eid] for eid, is_new in zip(event_ids, claimed) if is_new]
+        fresh.sort(key=lambda e: e.client_timestamp)
+
+        if not fresh:
+            return {"applied": 0, "duplicates": len(events), "courses_updated": []}
+
+        # (course_id, lesson_id) -> [time_spent, scores in client order]
+        merged = {}
+        for event in fresh:
+            delta = merged.setdefault((event.course_id, event.lesson_id), [0, []])
+            delta[0] += event.time_spent
+            delta[1].append(event.quiz_score)
+
+        op_id = uuid.uuid4().hex
+        try:
+            await self.write_lesson_deltas([
+                (user_id, course_id, lesson_id, time_spent, scores, True)
+                for (course_id, lesson_id), (time_spent, scores) in merged.items()
+            ], op_id)
+        except Exception as exc:
+            if _nothing_written(exc):
+                # Let the client retry these ids
+                await run_or_defer(self.redis.srem, dedup_key, *[e.event_id for e in fresh])
+            else:
+                # Some of the batch may already be in progress; a retry would apply it twice
+                logger.warning("Sync for %s may be partially written; keeping %d event ids claimed", user_id, len(fresh))
+            raise
+        await run_or_defer(self.rollups.record, [
+            (user_id, e.course_id, e.client_timestamp, e.time_spent, [e.quiz_score], True) for e in fresh
+        ], op_id)
+
+        # Invalidate each affected key exactly once
+        course_ids = sorted({course_id for course_id, _ in merged})
+        await invalidate(self.redis, *{k for course_id in course_ids for k in self._cache_keys(user_id, course_id)})
+        await run_or_defer(self.activity.record_activities, user_id, [e.client_timestamp for e in fresh])
+        await run_or_defer(
+            self.activity.count_learners, [(user_id, e.course_id, e.client_timestamp) for e in fresh]
+        )
+        await self._publish([
+            {
+                "type": "lesson_completed",
+                "user_id": user_id,
+                "course_id": course_id,
+                "lesson_id": lesson_id,
+                "time_spent": time_spent,
+                "quiz_score": scores[-1],
+                "attempts": len(scores),
+            }
+            for (course_id, lesson_id), (time_spent, scores) in merged.items()
+        ])
+
+        return {
+            "applied": len(fresh),
+            "duplicates": len(events) - len(fresh),
+            "courses_updated": course_ids,
+        }
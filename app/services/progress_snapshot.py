@@ -0,0 +1,245 @@
+# app/services/progress_snapshot.py
+
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from app.utils.config import settings
+
+# One row per (progress doc, lesson). Ids are dictionary-encoded into int32 codes
+# whose string values live in the *.ids.json tables.
+COLUMNS = {
+    "user": np.int32,
+    "course": np.int32,
+    "lesson": np.int32,
+    "completed": np.uint8,
+    "time_spent": np.int32,
+    "quiz_count": np.int32,
+    "quiz_sum": np.int64,
+    "quiz_best": np.int16,  # -1 when the lesson has no attempts
+}
+ID_TABLES = ("user", "course", "lesson")
+
+PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "course_id": 1,
+    "lessons.lesson_id": 1,
+    "lessons.completed": 1,
+    "lessons.time_spent_seconds": 1,
+    "lessons.quiz_summary": 1,
+    "lessons.quiz_scores": 1,
+}
+
+
+def _base_dir(base_dir: str = None) -> str:
+    return os.path.join(base_dir or settings.SNAPSHOT_DIR, "progress")
+
+
+class _Encoder:
+    """Dictionary encoder: string id -> dense int code."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def __call__(self, value) -> int:
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ProgressSnapshotExporter:
+    """
+    Streams the progress collection into a versioned columnar snapshot:
+
+        {SNAPSHOT_DIR}/progress/{version}/{column}.bin   fixed-width little-endian arrays
+        {SNAPSHOT_DIR}/progress/{version}/{table}.ids.json
+        {SNAPSHOT_DIR}/progress/{version}/manifest.json
+        {SNAPSHOT_DIR}/progress/current                  pointer file holding {version}
+
+    Rows are buffered per chunk and appended to the column files, so memory use
+    is bounded by SNAPSHOT_CHUNK_ROWS. The version directory is built under a
+    temporary name and published by renaming it and replacing the `current`
+    pointer file (no symlinks, which need extra privileges on Windows). File
+    writes and fsyncs run in a thread so the event loop keeps serving.
+    """
+
+    def __init__(self, db, base_dir: str = None):
+        self.db = db
+        self.base_dir = _base_dir(base_dir)
+
+    async def export(self) -> dict:
+        os.makedirs(self.base_dir, exist_ok=True)
+        version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f") + "-" + uuid.uuid4().hex[:6]
+        tmp_dir = os.path.join(self.base_dir, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+
+        encoders = {name: _Encoder() for name in ID_TABLES}
+        files = {name: open(os.path.join(tmp_dir, f"{name}.bin"), "wb") for name in COLUMNS}
+        buffers = {name: [] for name in COLUMNS}
+        rows = 0
+
+        def flush():
+            for name, dtype in COLUMNS.items():
+                np.asarray(buffers[name], dtype=np.dtype(dtype).newbyteorder("<")).tofile(files[name])
+                buffers[name].clear()
+
+        try:
+            cursor = self.db.progress.find({}, PROJECTION, batch_size=settings.SNAPSHOT_CURSOR_BATCH)
+            async for doc in cursor:
+                user = encoders["user"](doc.get("user_id"))
+                course = encoders["course"](doc.get("course_id"))
+                for lesson in doc.get("lessons") or []:
+                    summary = lesson.get("quiz_summary") or {}
+                    scores = lesson.get("quiz_scores") or []
+                    best = summary.get("best", max(scores) if scores else -1)
+                    buffers["user"].append(user)
+                    buffers["course"].append(course)
+                    buffers["lesson"].append(encoders["lesson"](lesson.get("lesson_id")))
+                    buffers["completed"].append(1 if lesson.get("completed") else 0)
+                    buffers["time_spent"].append(lesson.get("time_spent_seconds", 0))
+                    buffers["quiz_count"].append(summary.get("count", len(scores)))
+                    buffers["quiz_sum"].append(summary.get("sum", sum(scores)))
+                    buffers["quiz_best"].append(best)
+                    rows += 1
+                if len(buffers["user"]) >= settings.SNAPSHOT_CHUNK_ROWS:
+                    await asyncio.to_thread(flush)
+            await asyncio.to_thread(flush)
+        except BaseException:
+            for fh in files.values():
+                fh.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        return await asyncio.to_thread(self._finish, tmp_dir, version, files, encoders, rows)
+
+    def _finish(self, tmp_dir: str, version: str, files: dict, encoders: dict, rows: int) -> dict:
+        for fh in files.values():
+            fh.flush()
+            os.fsync(fh.fileno())
+            fh.close()
+
+        for name, encoder in encoders.items():
+            with open(os.path.join(tmp_dir, f"{name}.ids.json"), "w") as fh:
+                json.dump(encoder.values, fh)
+        manifest = {
+            "version": version,
+            "created_at": datetime.utcnow().isoformat(),
+            "rows": rows,
+            "columns": {name: np.dtype(dtype).newbyteorder("<").str for name, dtype in COLUMNS.items()},
+            "id_tables": {name: len(encoders[name].values) for name in ID_TABLES},
+        }
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as fh:
+            json.dump(manifest, fh)
+
+        self._publish(tmp_dir, version)
+        return manifest
+
+    def _publish(self, tmp_dir: str, version: str):
+        final_dir = os.path.join(self.base_dir, version)
+        os.rename(tmp_dir, final_dir)
+
+        # Atomic pointer swap: readers see either the old or the new version
+        pointer = os.path.join(self.base_dir, "current")
+        tmp_pointer = os.path.join(self.base_dir, f".current-{version}")
+        with open(tmp_pointer, "w") as fh:
+            fh.write(version)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_pointer, pointer)
+
+        versions = sorted(
+            d for d in os.listdir(self.base_dir)
+            if not d.startswith(".") and d not in ("current", version)
+            and os.path.isdir(os.path.join(self.base_dir, d))
+        ) + [version]
+        for old in versions[:-settings.SNAPSHOT_KEEP]:
+            shutil.rmtree(os.path.join(self.base_dir, old), ignore_errors=True)
+
+
+class ProgressSnapshot:
+    """Read-only, memory-mapped view of one snapshot version."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as fh:
+            self.manifest = json.load(fh)
+        rows = self.manifest["rows"]
+        self.columns = {
+            name: (np.memmap(os.path.join(path, f"{name}.bin"), dtype=np.dtype(dtype), mode="r", shape=(rows,))
+                   if rows else np.empty(0, dtype=np.dtype(dtype)))
+            for name, dtype in self.manifest["columns"].items()
+        }
+        self._ids = {}
+        self._codes = {}
+
+    @classmethod
+    def open(cls, base_dir: str = None) -> "ProgressSnapshot":
+        base = _base_dir(base_dir)
+        pointer = os.path.join(base, "current")
+        if not os.path.exists(pointer):
+            raise FileNotFoundError("No progress snapshot has been exported yet")
+        # Read once so a concurrent swap can't change files under us
+        if os.path.isdir(pointer):  # symlink left by older versions
+            return cls(os.path.realpath(pointer))
+        with open(pointer) as fh:
+            return cls(os.path.join(base, fh.read().strip()))
+
+    def ids(self, table: str) -> list:
+        if table not in self._ids:
+            with open(os.path.join(self.path, f"{table}.ids.json")) as fh:
+                self._ids[table] = json.load(fh)
+        return self._ids[table]
+
+    def code(self, table: str, value: str):
+        if table not in self._codes:
+            self._codes[table] = {v: i for i, v in enumerate(self.ids(table))}
+        return self._codes[table].get(value)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+
+def course_lesson_stats(snapshot_path: str, course_id: str) -> list:
+    """
+    Per-lesson completion, learners, average score and time for one course,
+    computed with vectorized bincounts over the memory-mapped columns.
+    Pure function of (path, course_id) so it can run in a worker process.
+    """
+    snapshot = ProgressSnapshot(snapshot_path)
+    course = snapshot.code("course", course_id)
+    if course is None:
+        return []
+
+    mask = snapshot["course"] == course
+    lessons = snapshot["lesson"][mask]
+    if not lessons.size:
+        return []
+    size = int(lessons.max()) + 1
+
+    learners = np.bincount(lessons, minlength=size)
+    completed = np.bincount(lessons, weights=snapshot["completed"][mask], minlength=size)
+    quiz_count = np.bincount(lessons, weights=snapshot["quiz_count"][mask], minlength=size)
+    quiz_sum = np.bincount(lessons, weights=snapshot["quiz_sum"][mask], minlength=size)
+    time_spent = np.bincount(lessons, weights=snapshot["time_spent"][mask], minlength=size)
+
+    lesson_ids = snapshot.ids("lesson")
+    return [
+        {
+            "lesson_id": lesson_ids[code],
+            "learners": int(learners[code]),
+            "completion_rate": float(completed[code] / learners[code]),
+            "avg_score": float(quiz_sum[code] / quiz_count[code]) if quiz_count[code] else 0.0,
+            "avg_time_spent": float(time_spent[code] / learners[code]),
+        }
+        for code in np.flatnonzero(learners)
+    ]
@@ -0,0 +1,252 @@
+# app/services/report_service.py
+
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from app.utils.config import settings
+from app.services.activity_service import ActivityService
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "report_jobs:queue"
+
+
+class ReportService:
+    """
+    Asynchronous report jobs.
+
+    - report_job:{job_id}        hash with status/progress, expires after REPORT_JOB_TTL
+    - report_job:dedupe:{digest} job id for identical (type, params) requests
+    - report_jobs:queue          list of queued job ids, consumed by run_worker()
+
+    Report files are written to the `reports` GridFS bucket, so any API worker
+    can serve a download regardless of which one built the report.
+    """
+
+    def __init__(self, db, redis_client):
+        self.db = db
+        self.redis = redis_client
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name="reports")
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"report_job:{job_id}"
+
+    @staticmethod
+    def _dedupe_key(report_type: str, params: dict) -> str:
+        digest = hashlib.sha256(json.dumps([report_type, params], sort_keys=True).encode()).hexdigest()
+        return f"report_job:dedupe:{digest}"
+
+    # ---------- Submit & status ----------
+    @staticmethod
+    def normalize_params(report_type: str, course_id: str = None, start: date = None, end: date = None) -> dict:
+        """Validate and reduce request params to the canonical form used for dedupe. Raises ValueError."""
+        if report_type == "course_progress":
+            if not course_id:
+                raise ValueError("course_id is required for course_progress reports")
+            return {"course_id": course_id}
+        if report_type == "platform_daily":
+            if not start or not end or end < start:
+                raise ValueError("A valid start/end range is required for platform_daily reports")
+            if (end - start).days >= settings.REPORT_MAX_RANGE_DAYS:
+                raise ValueError(f"Range is limited to {settings.REPORT_MAX_RANGE_DAYS} days")
+            return {"start": start.isoformat(), "end": end.isoformat()}
+        raise ValueError(f"Unknown report type: {report_type}")
+
+    async def submit(self, report_type: str, params: dict, requested_by: str = None) -> dict:
+        """Queue a report, or return the live job for an identical request."""
+        dedupe_key = self._dedupe_key(report_type, params)
+        existing = await self.redis.get(dedupe_key)
+        if existing:
+            job = await self.get(existing)
+            if job and not self._is_dead(job):
+                return {**job, "deduplicated": True}
+
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": job_id,
+            "type": report_type,
+            "params": json.dumps(params),
+            "status": "queued",
+            "progress": 0,
+            "requested_by": requested_by or "",
+            "created_at": now,
+            "updated_at": now,
+        }
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping=job)
+            pipe.expire(self._job_key(job_id), settings.REPORT_JOB_TTL)
+            pipe.set(dedupe_key, job_id, ex=settings.REPORT_JOB_TTL)
+            pipe.lpush(QUEUE_KEY, job_id)
+            await pipe.execute()
+        return {**self._decode(job), "deduplicated": False}
+
+    @staticmethod
+    def _is_dead(job: dict) -> bool:
+        # Failed, or stopped reporting progress (its worker went away)
+        if job["status"] == "failed":
+            return True
+        if job["status"] == "running":
+            updated = datetime.fromisoformat(job["updated_at"])
+            return datetime.utcnow() - updated > timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS)
+        return False
+
+    @staticmethod
+    def _decode(raw: dict) -> dict:
+        job = dict(raw)
+        job["params"] = json.loads(job.get("params") or "{}")
+        job["progress"] = float(job.get("progress", 0))
+        if "size" in job:
+            job["size"] = int(job["size"])
+        return job
+
+    async def get(self, job_id: str):
+        raw = await self.redis.hgetall(self._job_key(job_id))
+        return self._decode(raw) if raw else None
+
+    async def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        await self.redis.hset(self._job_key(job_id), mapping=fields)
+
+    # ---------- Download ----------
+    async def open_result(self, job: dict):
+        return await self.bucket.open_download_stream(ObjectId(job["file_id"]))
+
+    @staticmethod
+    async def iter_result(grid_out):
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    # ---------- Worker ----------
+    async def run_worker(self):
+        """Consume queued jobs one at a time until cancelled."""
+        while True:
+            try:
+                item = await self.redis.brpop(QUEUE_KEY, timeout=settings.REPORT_QUEUE_POLL_SECONDS)
+                if item:
+                    await self.execute(item[1])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Report worker iteration failed")
+                await asyncio.sleep(1)
+
+    async def execute(self, job_id: str):
+        job = await self.get(job_id)
+        if not job or job["status"] != "queued":
+            return
+        await self._update(job_id, status="running", started_at=datetime.utcnow().isoformat())
+
+        generator = {
+            "course_progress": self._course_progress_csv,
+            "platform_daily": self._platform_daily_csv,
+        }[job["type"]]
+        filename = f"{job['type']}-{job_id}.csv"
+        grid_in = self.bucket.open_upload_stream(
+            filename, metadata={"job_id": job_id, "type": job["type"], "params": job["params"]}
+        )
+        size = 0
+        try:
+            async for chunk, progress in generator(**job["params"]):
+                await grid_in.write(chunk)
+                size += len(chunk)
+                await self._update(job_id, progress=round(progress, 1))
+            await grid_in.close()
+        except asyncio.CancelledError:
+            await grid_in.abort()
+            await self._update(job_id, status="queued", progress=0)
+            await self.redis.rpush(QUEUE_KEY, job_id)  # hand it to another worker
+            raise
+        except Exception as e:
+            logger.exception("Report job %s failed", job_id)
+            await grid_in.abort()
+            await self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+            return
+
+        await self._update(
+            job_id,
+            status="done",
+            progress=100,
+            file_id=str(grid_in._id),
+            filename=filename,
+            size=size,
+            finished_at=datetime.utcnow().isoformat(),
+        )
+
+    async def purge_expired(self):
+        """Delete report files older than the job TTL (their job records are gone)."""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.REPORT_JOB_TTL)
+        async for f in self.bucket.find({"uploadDate": {"$lt": cutoff}}):
+            await self.bucket.delete(f._id)
+
+    # ---------- Generators: yield (csv bytes, percent done) ----------
+    @staticmethod
+    def _csv_chunk(rows) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue().encode()
+
+    async def _course_progress_csv(self, course_id: str):
+        total = await self.db.progress.count_documents({"course_id": course_id})
+        yield self._csv_chunk([[
+            "user_id", "lesson_id", "completed", "time_spent_seconds", "quiz_attempts", "quiz_avg", "quiz_best"
+        ]]), 0
+
+        cursor = self.db.progress.find(
+            {"course_id": course_id},
+            {"_id": 0, "user_id": 1, "lessons": 1},
+            batch_size=settings.REPORT_BATCH_SIZE,
+        )
+        rows, seen = [], 0
+        async for doc in cursor:
+            seen += 1
+            for lesson in doc.get("lessons") or []:
+                summary = lesson.get("quiz_summary") or {}
+                scores = lesson.get("quiz_scores") or []
+                count = summary.get("count", len(scores))
+                rows.append([
+                    doc.get("user_id"),
+                    lesson.get("lesson_id"),
+                    bool(lesson.get("completed")),
+                    lesson.get("time_spent_seconds", 0),
+                    count,
+                    round(summary.get("sum", sum(scores)) / count, 2) if count else "",
+                    summary.get("best", max(scores) if scores else ""),
+                ])
+            if seen % settings.REPORT_BATCH_SIZE == 0:
+                yield self._csv_chunk(rows), 100 * seen / max(total, seen)
+                rows = []
+        yield self._csv_chunk(rows), 100
+
+    async def _platform_daily_csv(self, start: str, end: str):
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+        activity = ActivityService(self.redis)
+        daily_actives = await activity.daily_actives(start, end)
+        yield self._csv_chunk([["date", "completions", "active_learners", "avg_score", "time_spent"]]), 10
+
+        report = await RollupService(self.db, self.redis).platform_range(start, end, daily_actives)
+        yield self._csv_chunk([
+            [row["date"].isoformat(), row["completions"], row["active_learners"],
+             round(row["avg_score"], 2), row["time_spent"]]
+            for row in report["daily"]
+        ]), 90
+
+        totals = report["totals"]
+        yield self._csv_chunk([[
+            "total", totals["completions"], totals.get("distinct_active_learners", totals["learner_days"]),
+            round(totals["avg_score"], 2), totals["time_spent"]
+        ]]), 100
@@ -0,0 +1,160 @@
+# app/services/rollup_service.py
+
+import uuid
+from datetime import date, datetime, timedelta
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.utils.config import settings
+from app.utils.redis_breaker import apply_once
+
+
+def _learner_dedup_seconds() -> int:
+    # A late offline event must still find its day's set, or the learner is counted twice
+    days = max(settings.ROLLUP_LEARNER_DEDUP_DAYS, settings.PROGRESS_SYNC_DEDUP_TTL // 86400 + 1)
+    return days * 86400
+
+
+def _day(when=None) -> date:
+    if when is None:
+        return datetime.utcnow().date()
+    return when.date() if isinstance(when, datetime) else when
+
+
+class RollupService:
+    """
+    Per-course-per-day rollups in course_daily_rollups, written incrementally by
+    the progress write path:
+
+        {_id: "{course_id}:{YYYY-MM-DD}", course_id, day, completions,
+         score_sum, score_count, time_sum, active_learners}
+
+    active_learners is de-duplicated with a short-lived Redis set per course-day,
+    kept at least as long as offline sync events can arrive for that day.
+    """
+
+    def __init__(self, db, redis_client):
+        self.db = db
+        self.redis = redis_client
+
+    @staticmethod
+    def _rollup_id(course_id: str, day: date) -> str:
+        return f"{course_id}:{day.isoformat()}"
+
+    @staticmethod
+    def _learners_key(course_id: str, day: date) -> str:
+        return f"rollup_learners:{course_id}:{day.isoformat()}"
+
+    async def ensure_indexes(self):
+        await self.db.course_daily_rollups.create_index([("day", ASCENDING)])
+
+    async def record(self, entries, op_id: str = None):
+        """
+        entries: iterable of (user_id, course_id, when, time_spent, quiz_scores, completed)
+
+        The learner SADDs run once per op_id, so a replay after a timed-out
+        attempt still sees which learners were new.
+        """
+        buckets = {}
+        learners = set()
+        for user_id, course_id, when, time_spent, scores, completed in entries:
+            day = _day(when)
+            bucket = buckets.setdefault((course_id, day), {
+                "completions": 0, "score_sum": 0, "score_count": 0, "time_sum": 0, "active_learners": 0
+            })
+            bucket["completions"] += 1 if completed else 0
+            bucket["score_sum"] += sum(scores)
+            bucket["score_count"] += len(scores)
+            bucket["time_sum"] += time_spent
+            learners.add((user_id, course_id, day))
+
+        if not buckets:
+            return
+
+        learners = sorted(learners)
+        commands = []
+        for user_id, course_id, day in learners:
+            commands.append(("SADD", self._learners_key(course_id, day), user_id))
+            commands.append(("EXPIRE", self._learners_key(course_id, day), _learner_dedup_seconds()))
+        results = await apply_once(self.redis, op_id or uuid.uuid4().hex, "rollup_learners", commands)
+        for (_, course_id, day), added in zip(learners, results[::2]):
+            buckets[(course_id, day)]["active_learners"] += added
+
+        operations = [
+            UpdateOne(
+                {"_id": self._rollup_id(course_id, day)},
+                {
+                    "$inc": {k: v for k, v in bucket.items() if v},
+                    "$setOnInsert": {"course_id": course_id, "day": datetime.combine(day, datetime.min.time())},
+                },
+                upsert=True
+            )
+            for (course_id, day), bucket in buckets.items() if any(bucket.values())
+        ]
+        if operations:
+            await self.db.course_daily_rollups.bulk_write(operations, ordered=False)
+
+    # ---------- Reads ----------
+    @staticmethod
+    def _rows(start: date, end: date, docs_by_day: dict):
+        rows = []
+        for i in range((end - start).days + 1):
+            day = start + timedelta(days=i)
+            doc = docs_by_day.get(day, {})
+            score_count = doc.get("score_count", 0)
+            rows.append({
+                "date": day,
+                "completions": doc.get("completions", 0),
+                "active_learners": doc.get("active_learners", 0),
+                "avg_score": doc.get("score_sum", 0) / score_count if score_count else 0,
+                "time_spent": doc.get("time_sum", 0),
+            })
+        return rows
+
+    @staticmethod
+    def _summary(rows, docs):
+        score_count = sum(d.get("score_count", 0) for d in docs)
+        return {
+            "completions": sum(r["completions"] for r in rows),
+            "learner_days": sum(r["active_learners"] for r in rows),
+            "avg_score": sum(d.get("score_sum", 0) for d in docs) / score_count if score_count else 0,
+            "time_spent": sum(r["time_spent"] for r in rows),
+        }
+
+    async def course_range(self, course_id: str, start: date, end: date) -> dict:
+        # Range scan on the _id index ("course_id:YYYY-MM-DD" sorts by day)
+        docs = await self.db.course_daily_rollups.find({
+            "_id": {"$gte": self._rollup_id(course_id, start), "$lte": self._rollup_id(course_id, end)}
+        }).to_list(length=None)
+        rows = self._rows(start, end, {d["day"].date(): d for d in docs})
+        return {"course_id": course_id, "start": start, "end": end, "totals": self._summary(rows, docs), "daily": rows}
+
+    async def platform_range(self, start: date, end: date, daily_actives: dict = None) -> dict:
+        pipeline = [
+            {"$match": {"day": {
+                "$gte": datetime.combine(start, datetime.min.time()),
+                "$lte": datetime.combine(end, datetime.min.time()),
+            }}},
+            {"$group": {
+                "_id": "$day",
+                "completions": {"$sum": "$completions"},
+                "score_sum": {"$sum": "$score_sum"},
+                "score_count": {"$sum": "$score_count"},
+                "time_sum": {"$sum": "$time_sum"},
+                "active_learners": {"$sum": "$active_learners"},
+            }},
+        ]
+        docs = await self.db.course_daily_rollups.aggregate(pipeline).to_list(length=None)
+        rows = self._rows(start, end, {d["_id"].date(): d for d in docs})
+
+        # Summing per-course learners would count a user once per course; use the
+        # platform day bitmaps for distinct learners when available
+        if daily_actives:
+            per_day = {row["date"]: row["active_learners"] for row in daily_actives["daily"]}
+            for row in rows:
+                row["active_learners"] = per_day.get(row["date"].isoformat(), 0)
+
+        response = {"start": start, "end": end, "totals": self._summary(rows, docs), "daily": rows}
+        if daily_actives:
+            response["totals"]["distinct_active_learners"] = daily_actives["distinct_active_learners"]
+        return response
@@ -0,0 +1,86 @@
+# app/services/score_distribution_service.py
+
+import uuid
+
+from app.utils.config import settings
+from app.utils.redis_breaker import apply_once
+
+
+class ScoreDistributionService:
+    """
+    Quiz-score distributions per course and per lesson.
+
+    Scores are bounded integers (0..QUIZ_SCORE_MAX), so the sketch is a fixed-bin
+    histogram stored as a Redis hash (field = bucket lower bound, value = count):
+    constant size, updated with one HINCRBY per score, and mergeable by adding
+    counts. Percentiles are reported as the lower bound of the bucket holding the
+    requested rank, so the error is below QUIZ_SCORE_BUCKET_WIDTH (exact when
+    the width is 1).
+
+    Keys:
+    - quiz_scores:hist:{course_id}
+    - quiz_scores:hist:{course_id}:{lesson_id}
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def _key(course_id: str, lesson_id: str = None) -> str:
+        if lesson_id:
+            return f"quiz_scores:hist:{course_id}:{lesson_id}"
+        return f"quiz_scores:hist:{course_id}"
+
+    @staticmethod
+    def _bucket(score: int) -> int:
+        width = settings.QUIZ_SCORE_BUCKET_WIDTH
+        score = max(0, min(int(score), settings.QUIZ_SCORE_MAX))
+        return score - score % width
+
+    async def record(self, entries, op_id: str = None):
+        """entries: iterable of (course_id, lesson_id, quiz_scores); applied once per op_id."""
+        increments = []
+        for course_id, lesson_id, scores in entries:
+            for score in scores:
+                bucket = self._bucket(score)
+                increments.append(("HINCRBY", self._key(course_id), bucket, 1))
+                increments.append(("HINCRBY", self._key(course_id, lesson_id), bucket, 1))
+        await apply_once(self.redis, op_id or uuid.uuid4().hex, "quiz_scores", increments)
+
+    @staticmethod
+    def _quantile(buckets, total: int, percentile: float) -> int:
+        # Nearest-rank over the cumulative bucket counts
+        rank = max(1, -(-percentile * total // 100))
+        seen = 0
+        for bucket, count in buckets:
+            seen += count
+            if seen >= rank:
+                return bucket
+        return buckets[-1][0]
+
+    async def distribution(self, course_id: str, lesson_id: str = None, percentiles=(50, 90, 99), bins: int = 10):
+        raw = await self.redis.hgetall(self._key(course_id, lesson_id))
+        buckets = sorted((int(b), int(c)) for b, c in raw.items() if int(c) > 0)
+        total = sum(c for _, c in buckets)
+
+        # Coarsen to `bins` equal-width ranges for display
+        bin_width = max(settings.QUIZ_SCORE_BUCKET_WIDTH, -(-(settings.QUIZ_SCORE_MAX + 1) // bins))
+        histogram = {}
+        for bucket, count in buckets:
+            low = bucket - bucket % bin_width
+            histogram[low] = histogram.get(low, 0) + count
+
+        return {
+            "course_id": course_id,
+            "lesson_id": lesson_id,
+            "count": total,
+            "mean": sum(b * c for b, c in buckets) / total if total else 0,
+            "percentiles": {
+                f"{p:g}": self._quantile(buckets, total, p) if total else None for p in percentiles
+            },
+            "histogram": [
+                {"low": low, "high": min(low + bin_width - 1, settings.QUIZ_SCORE_MAX), "count": histogram.get(low, 0)}
+                for low in range(0, settings.QUIZ_SCORE_MAX + 1, bin_width)
+            ],
+            "error_bound": settings.QUIZ_SCORE_BUCKET_WIDTH - 1,
+        }
@@ -0,0 +1,30 @@
+# app/utils/background.py
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodic(name: str, interval: float, func, *args):
+    """
+    Call `await func(*args)` every `interval` seconds until cancelled.
+    Errors are logged and the loop keeps going so one bad cycle can't kill the job.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await func(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background job %s failed", name)
+
+
+def start_background(name: str, interval: float, func, *args) -> asyncio.Task:
+    return asyncio.create_task(run_periodic(name, interval, func, *args), name=name)
+
+
+async def stop_background(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
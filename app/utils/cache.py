@@ -5,30 +5,75 @@
 #
 
 # app/utils/cache.py
-import json
+import inspect
+import random
 from functools import wraps
 
-def redis_cache(redis_client, key: str, ttl: int):
+from app.utils import codec
+from app.utils.config import settings
+
+# Stored in place of a None result so "not found" can be told apart from a miss
+NEGATIVE = {"__cache_negative__": 1}
+
+
+def jittered_ttl(ttl: int) -> int:
+    """Spread expiry by ±CACHE_TTL_JITTER so entries filled together don't expire together."""
+    spread = ttl * settings.CACHE_TTL_JITTER
+    return max(1, round(ttl + random.uniform(-spread, spread)))
+
+
+def cached(key: str, ttl, negative_ttl=None, bypass: str = "refresh", redis_client=None):
+    """
+    Cache an async function's result in Redis.
+
+    key          format template filled from the call's arguments by name,
+                 e.g. "analytics:course:{course_id}"
+    ttl          seconds, or the name of a Settings attribute (read per call)
+    negative_ttl how long a None ("not found") result is cached; defaults to
+                 CACHE_NEGATIVE_TTL, 0 disables negative caching
+    bypass       name of a boolean argument that skips the read (the fresh
+                 result is still written back)
+    redis_client client to use; by default the bound service's self.redis
+    """
     def decorator(func):
+        signature = inspect.signature(func)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            cached = await redis_client.get(key)
-            if cached:
-                return json.loads(cached)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            client = redis_client if redis_client is not None else arguments["self"].redis
+            cache_key = key.format(**arguments)
+
+            if not arguments.get(bypass):
+                value = await codec.get(client, cache_key)
+                if value is not None:
+                    return None if value == NEGATIVE else value
+
             result = await func(*args, **kwargs)
-            await redis_client.set(key, json.dumps(result), ex=ttl)
+            if result is None:
+                seconds = settings.CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+                if seconds:
+                    await codec.set(client, cache_key, NEGATIVE, jittered_ttl(seconds))
+            else:
+                seconds = getattr(settings, ttl) if isinstance(ttl, str) else ttl
+                await codec.set(client, cache_key, result, jittered_ttl(seconds))
             return result
         return wrapper
     return decorator
 
+
+def redis_cache(redis_client, key: str, ttl: int):
+    return cached(key, ttl, redis_client=redis_client)
+
 async def invalidate_cache(redis_client, key: str):
     async for k in redis_client.scan_iter(key):
         await redis_client.delete(k)
 
 # ✅ Add direct helpers so you can call cache.get / cache.set
 async def get(redis_client, key: str):
-    data = await redis_client.get(key)
-    return json.loads(data) if data else None
+    return await codec.get(redis_client, key)
 
 async def set(redis_client, key: str, value: dict, ttl: int = 3600):
-    await redis_client.set(key, json.dumps(value), ex=ttl)
+    await codec.set(redis_client, key, value, ttl)
@@ -0,0 +1,218 @@
+# app/utils/cache_stats.py
+"""
+Per-namespace cache statistics.
+
+Each worker counts hits, misses, fills, fill latency, payload bytes and
+evictions in memory and periodically adds them to Redis hashes
+(cache_stats:{namespace}) with HINCRBY, so the numbers cover every worker
+without an extra round trip on each cache call.
+
+Fill latency is the time between a miss on a key and the next write of that
+key by the same worker, i.e. how long it took to recompute the value.
+"""
+
+import asyncio
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = "cache_stats:"
+EVICTION_LEASE_KEY = "cache_stats_eviction_listener"
+
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# First match wins; anything else is grouped by its first key segment
+NAMESPACE_RULES = [
+    (re.compile(r"^analytics:(course|student|platform)(:|$)"), lambda m: f"analytics:{m.group(1)}"),
+    (re.compile(r"^course:[^:]+:user:"), "progress"),
+    (re.compile(r"^progress:"), "progress"),
+    (re.compile(r"^course:[^:]+$"), "course"),
+    (re.compile(r"^courses_list:"), "courses_list"),
+    (re.compile(r"^(user_dashboard:|user:[^:]+:dashboard$)"), "user_dashboard"),
+    (re.compile(r"^user_session:"), "sessions"),
+]
+
+COUNTERS = ("hits", "misses", "fills", "fill_ms", "bytes_read", "bytes_written", "evictions")
+
+
+def namespace(key: str) -> str:
+    for pattern, name in NAMESPACE_RULES:
+        match = pattern.match(key)
+        if match:
+            return name(match) if callable(name) else name
+    return key.split(":", 1)[0]
+
+
+class CacheStats:
+    def __init__(self):
+        self._counts = {}
+        self._misses_at = OrderedDict()  # key -> monotonic time of the last miss
+
+    def _add(self, key: str, field: str, amount=1):
+        counts = self._counts.setdefault(namespace(key), {})
+        counts[field] = counts.get(field, 0) + amount
+
+    # ---------- Recording (in-memory, no I/O) ----------
+    def record_hit(self, key: str, nbytes: int = 0):
+        self._add(key, "hits")
+        if nbytes:
+            self._add(key, "bytes_read", nbytes)
+
+    def record_miss(self, key: str):
+        self._add(key, "misses")
+        self._misses_at[key] = time.monotonic()
+        self._misses_at.move_to_end(key)
+        while len(self._misses_at) > settings.CACHE_STATS_PENDING_FILLS:
+            self._misses_at.popitem(last=False)
+
+    def record_fill(self, key: str, nbytes: int = 0):
+        self._add(key, "fills")
+        if nbytes:
+            self._add(key, "bytes_written", nbytes)
+        missed_at = self._misses_at.pop(key, None)
+        if missed_at is not None:
+            self._add(key, "fill_ms", round((time.monotonic() - missed_at) * 1000))
+            self._add(key, "timed_fills")
+
+    def record_lookup(self, key: str, value):
+        """Hit/miss for plain (non-codec) reads."""
+        if value is None:
+            self.record_miss(key)
+        else:
+            self.record_hit(key, len(value))
+
+    # ---------- Aggregation in Redis ----------
+    async def flush(self, redis_client):
+        counts, self._counts = self._counts, {}
+        if not counts:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for ns, fields in counts.items():
+                    for field, amount in fields.items():
+                        pipe.hincrby(f"{STATS_PREFIX}{ns}", field, amount)
+                await pipe.execute()
+        except Exception:
+            # Put the counts back so the next flush retries them
+            for ns, fields in counts.items():
+                merged = self._counts.setdefault(ns, {})
+                for field, amount in fields.items():
+                    merged[field] = merged.get(field, 0) + amount
+            raise
+
+    async def read(self, redis_client) -> dict:
+        keys = [key async for key in redis_client.scan_iter(match=f"{STATS_PREFIX}*", count=100)]
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            rows = await pipe.execute()
+
+        stats = {}
+        for key, row in zip(keys, rows):
+            row = {field: int(value) for field, value in row.items()}
+            lookups = row.get("hits", 0) + row.get("misses", 0)
+            stats[key[len(STATS_PREFIX):]] = {
+                **{field: row.get(field, 0) for field in COUNTERS if field != "fill_ms"},
+                "hit_rate": round(row.get("hits", 0) / lookups, 4) if lookups else None,
+                "avg_fill_ms": round(row["fill_ms"] / row["timed_fills"], 2) if row.get("timed_fills") else None,
+            }
+        return stats
+
+    async def reset(self, redis_client):
+        self._counts = {}
+        keys = [key async for key in redis_client.scan_iter(match=f"{STATS_PREFIX}*", count=100)]
+        if keys:
+            await redis_client.delete(*keys)
+
+    # ---------- Memory sampling ----------
+    @staticmethod
+    async def memory_by_namespace(redis_client) -> dict:
+        """
+        Estimate keys and bytes per namespace from a SCAN sample of up to
+        CACHE_STATS_MEMORY_SAMPLES keys, sized with MEMORY USAGE and scaled
+        up by dbsize / sampled keys.
+        """
+        sample = []
+        async for key in redis_client.scan_iter(count=500):
+            sample.append(key)
+            if len(sample) >= settings.CACHE_STATS_MEMORY_SAMPLES:
+                break
+        if not sample:
+            return {}
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in sample:
+                pipe.memory_usage(key)
+            sizes = await pipe.execute(raise_on_error=False)
+        if all(isinstance(size, Exception) for size in sizes):
+            return {}  # MEMORY USAGE unavailable (e.g. disabled on a managed server)
+
+        scale = await redis_client.dbsize() / len(sample)
+        memory = {}
+        for key, size in zip(sample, sizes):
+            entry = memory.setdefault(namespace(key), {"sampled_keys": 0, "sampled_bytes": 0})
+            entry["sampled_keys"] += 1
+            entry["sampled_bytes"] += size if isinstance(size, int) else 0
+        for entry in memory.values():
+            entry["estimated_keys"] = round(entry["sampled_keys"] * scale)
+            entry["estimated_bytes"] = round(entry["sampled_bytes"] * scale)
+        return memory
+
+    # ---------- Evictions ----------
+    async def track_evictions(self, redis_client):
+        """
+        Count evicted keys per namespace from keyspace notifications. Every
+        worker runs this, but only the holder of a short Redis lease listens,
+        so each eviction is counted once. Needs notify-keyspace-events to
+        include 'Ee'; it is enabled here if the server allows CONFIG SET.
+        """
+        try:
+            config = (await redis_client.config_get("notify-keyspace-events")).get("notify-keyspace-events", "")
+            if "E" not in config or not ("e" in config or "A" in config):
+                await redis_client.config_set("notify-keyspace-events", config + "Ee")
+        except Exception:
+            logger.warning("Could not enable keyspace eviction events; per-namespace evictions won't be counted")
+            return
+
+        token = uuid.uuid4().hex
+        lease = settings.CACHE_STATS_EVICTION_LEASE_SECONDS
+        while True:
+            try:
+                if await redis_client.set(EVICTION_LEASE_KEY, token, nx=True, ex=lease):
+                    await self._listen_evictions(redis_client, token, lease)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Eviction listener failed")
+            await asyncio.sleep(lease / 2)
+
+    async def _listen_evictions(self, redis_client, token: str, lease: int):
+        db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+        pubsub = redis_client.pubsub()
+        await pubsub.subscribe(f"__keyevent@{db}__:evicted")
+        renew_at = time.monotonic() + lease / 3
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    self._add(message["data"], "evictions")
+                if time.monotonic() >= renew_at:
+                    if not await redis_client.eval(_RENEW_SCRIPT, 1, EVICTION_LEASE_KEY, token, lease):
+                        return  # lost the lease
+                    renew_at = time.monotonic() + lease / 3
+        finally:
+            await pubsub.close()
+
+
+# One collector per worker process
+cache_stats = CacheStats()
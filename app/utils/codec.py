@@ -0,0 +1,150 @@
+# app/utils/codec.py
+"""
+Cache value codec.
+
+Every entry written through this module starts with a two-byte header:
+
+    byte 0  MAGIC (0xC1, never the first byte of valid UTF-8, so it can't be
+            confused with legacy plain-JSON entries)
+    byte 1  high nibble: format version, low nibble: flags (FLAG_ZLIB)
+
+followed by a JSON body (orjson when installed, stdlib json otherwise),
+zlib-compressed when it is larger than CACHE_COMPRESS_THRESHOLD bytes.
+
+Redis clients are created with decode_responses=True, so reads go through
+NEVER_DECODE to get the raw bytes without a UTF-8 decode of the payload.
+Values without the header (written before this codec) are decoded as plain JSON.
+
+While Redis is unavailable (see app.utils.redis_breaker) reads count as
+misses and writes are skipped, so callers fall back to the database.
+"""
+
+import json
+import zlib
+from datetime import date, datetime
+
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.utils.config import settings
+from app.utils.cache_stats import cache_stats
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+MAGIC = 0xC1
+VERSION = 1
+FLAG_ZLIB = 0x1
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "tolist"):  # numpy scalars/arrays
+        return value.tolist()
+    return str(value)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _dumps(value) -> bytes:
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+    _loads = orjson.loads
+else:
+    def _dumps(value) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+    _loads = json.loads
+
+
+def encode(value) -> bytes:
+    body = _dumps(value)
+    flags = 0
+    if len(body) > settings.CACHE_COMPRESS_THRESHOLD:
+        compressed = zlib.compress(body, settings.CACHE_COMPRESS_LEVEL)
+        if len(compressed) < len(body):
+            body, flags = compressed, FLAG_ZLIB
+    return bytes((MAGIC, VERSION << 4 | flags)) + body
+
+
+def decode(raw):
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if len(raw) < 2 or raw[0] != MAGIC:
+        return _loads(raw)
+    version, flags = raw[1] >> 4, raw[1] & 0xF
+    if version != VERSION:
+        raise ValueError(f"Unsupported cache entry version {version}")
+    body = raw[2:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    return _loads(body)
+
+
+# ---------- Redis helpers ----------
+async def get(redis_client, key: str):
+    """Read and decode one entry; a corrupt or unknown-version entry counts as a miss."""
+    try:
+        raw = await redis_client.execute_command("GET", key, NEVER_DECODE=True)
+    except (ConnectionError, TimeoutError):
+        return None
+    try:
+        value = decode(raw)
+    except (ValueError, zlib.error):
+        value = None
+    if value is None:
+        cache_stats.record_miss(key)
+    else:
+        cache_stats.record_hit(key, len(raw))
+    return value
+
+
+async def mget(redis_client, keys) -> list:
+    if not keys:
+        return []
+    try:
+        raws = await redis_client.execute_command("MGET", *keys, NEVER_DECODE=True)
+    except (ConnectionError, TimeoutError):
+        return [None] * len(keys)
+    values = []
+    for key, raw in zip(keys, raws):
+        try:
+            value = decode(raw)
+        except (ValueError, zlib.error):
+            value = None
+        if value is None:
+            cache_stats.record_miss(key)
+        else:
+            cache_stats.record_hit(key, len(raw))
+        values.append(value)
+    return values
+
+
+async def set(redis_client, key: str, value, ttl: int = None):
+    data = encode(value)
+    try:
+        await redis_client.set(key, data, ex=ttl)
+    except (ConnectionError, TimeoutError):
+        return
+    cache_stats.record_fill(key, len(data))
+
+
+async def set_many(redis_client, items):
+    """Write (key, value, ttl) triples in one pipelined round trip."""
+    if not items:
+        return
+    encoded = [(key, encode(value), ttl) for key, value, ttl in items]
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, data, ttl in encoded:
+                pipe.set(key, data, ex=ttl)
+            await pipe.execute()
+    except (ConnectionError, TimeoutError):
+        return
+    for key, data, _ in encoded:
+        cache_stats.record_fill(key, len(data))
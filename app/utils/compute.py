@@ -0,0 +1,148 @@
+# app/utils/compute.py
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _timed_call(func, args, kwargs):
+    """Runs in the worker: returns (start wall time, compute seconds, result)."""
+    started = time.time()
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return started, time.perf_counter() - t0, result
+
+
+class _Timings:
+    """Count/total/max plus a window of recent samples for percentiles."""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 2) if recent else 0.0
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class ComputeExecutor:
+    """
+    Process pool for CPU-heavy analytics, so number crunching doesn't stall the
+    event loop. Submit module-level pure functions with compact, picklable
+    inputs (ids, paths, plain lists/arrays), never Motor documents or clients.
+
+    - At most ANALYTICS_COMPUTE_MAX_PENDING tasks are queued or running; extra
+      submitters wait, and that wait counts as queue time.
+    - Each task has a timeout (ANALYTICS_COMPUTE_TIMEOUT by default). A task
+      that times out or whose caller is cancelled is dropped from the queue if
+      it hasn't started; one already running finishes in its worker and its
+      result is discarded.
+    - Workers use the spawn start method: forking a process that runs an event
+      loop and open sockets is unsafe.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None):
+        self.workers = workers or settings.ANALYTICS_COMPUTE_WORKERS
+        self.max_pending = max_pending or settings.ANALYTICS_COMPUTE_MAX_PENDING
+        self._pool = None
+        # Outlives pool rebuilds, so max_pending holds across them
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "timed_out": 0, "cancelled": 0}
+        self.queue_wait = _Timings(settings.ANALYTICS_COMPUTE_METRICS_WINDOW)
+        self.compute_time = _Timings(settings.ANALYTICS_COMPUTE_METRICS_WINDOW)
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """Run func(*args, **kwargs) in a worker process and return its result."""
+        timeout = timeout or settings.ANALYTICS_COMPUTE_TIMEOUT
+        pool = self._ensure_pool()
+        slots = self._slots
+        submitted = time.time()
+        deadline = time.monotonic() + timeout
+        self.counters["submitted"] += 1
+
+        future = None
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+            try:
+                future = pool.submit(_timed_call, func, args, kwargs)
+                started, elapsed, result = await asyncio.wait_for(
+                    asyncio.wrap_future(future), max(0, deadline - time.monotonic())
+                )
+            finally:
+                slots.release()
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            if future is not None:
+                future.cancel()
+            raise
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            if future is not None:
+                future.cancel()
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+            self.counters["failed"] += 1
+            logger.error("Analytics compute pool broken, recreating")
+            if self._pool is pool:
+                self.shutdown()
+            raise
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+
+        self.counters["completed"] += 1
+        self.queue_wait.add(max(0.0, started - submitted))
+        self.compute_time.add(elapsed)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "running": self._pool is not None,
+            **self.counters,
+            "queue_wait": self.queue_wait.summary(),
+            "compute_time": self.compute_time.summary(),
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# One pool per API worker process
+compute_executor = ComputeExecutor()
@@ -1,6 +1,4 @@
 import os
-import redis.asyncio as aioredis   # async Redis
-import motor.motor_asyncio         # async Mongo
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -23,6 +21,35 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_AVAILABLE: bool = False
 
+    # Connection pools (one Mongo and one Redis pool per worker, see app/db.py)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 30000
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: int = 5           # seconds to wait for a free connection
+    REDIS_SOCKET_TIMEOUT: int = 10        # must exceed REPORT_QUEUE_POLL_SECONDS (BRPOP)
+    REDIS_SOCKET_CONNECT_TIMEOUT: int = 3
+    REDIS_SOCKET_KEEPALIVE: bool = True
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    POOL_METRICS_WINDOW: int = 1000
+
+    # Redis circuit breaker (app/utils/redis_breaker.py)
+    REDIS_COMMAND_TIMEOUT: float = 1.0     # per command, blocking commands excepted
+    REDIS_PIPELINE_TIMEOUT: float = 3.0
+    REDIS_BREAKER_FAILURES: int = 5        # consecutive failures before the circuit opens
+    REDIS_BREAKER_RESET_SECONDS: float = 10
+    REDIS_REPLAY_QUEUE_MAX: int = 10000    # deferred writes kept while Redis is down
+    REDIS_REPLAY_OP_TTL: int = 21600       # how long applied op ids are remembered for replays
+
+    # Startup / readiness
+    STARTUP_DEADLINE_SECONDS: float = 10   # serve (not ready) after this even if backends are down
+    STARTUP_PROBE_INTERVAL: float = 1
+    READINESS_PROBE_TIMEOUT: float = 2
+
     # JWT
     JWT_SECRET: str = "supersecretkey"
     SECRET_KEY: str = "supersecretkey"
@@ -40,8 +67,93 @@ class Settings(BaseSettings):
     USER_DASHBOARD_CACHE_TTL: int = 300
     ANALYTICS_COURSE_TTL: int = 900
     ANALYTICS_PLATFORM_TTL: int = 3600
+    ANALYTICS_STUDENT_TTL: int = 1800
     POPULAR_COURSES_TTL: int = 3600
     USER_RECOMMENDATIONS_TTL: int = 21600
+    LEARNING_STREAKS_TTL: int = 3600
+    CACHE_TTL_JITTER: float = 0.1  # ± fraction of the TTL, spreads out expiry
+    CACHE_NEGATIVE_TTL: int = 30  # how long "not found" results are cached
+    COURSE_L1_MAXSIZE: int = 1000  # per-worker course cache for batch reads
+    COURSE_L1_TTL: int = 30
+    COURSE_BATCH_MAX_IDS: int = 100
+
+    # Cache codec: values larger than this many bytes are zlib-compressed
+    CACHE_COMPRESS_THRESHOLD: int = 1024
+    CACHE_COMPRESS_LEVEL: int = 1
+
+    # Selective cache flush
+    CACHE_FLUSH_BATCH: int = 500
+    CACHE_FLUSH_KEYS_PER_SECOND: int = 20000
+    CACHE_FLUSH_LOCK_SECONDS: int = 120
+    CACHE_FLUSH_JOB_TTL: int = 86400
+
+    # Cache statistics
+    CACHE_STATS_FLUSH_INTERVAL: int = 10
+    CACHE_STATS_PENDING_FILLS: int = 10000
+    CACHE_STATS_MEMORY_SAMPLES: int = 1000
+    CACHE_TRACK_EVICTIONS: bool = True
+    CACHE_STATS_EVICTION_LEASE_SECONDS: int = 30
+
+    # Progress
+    PROGRESS_SYNC_DEDUP_TTL: int = 604800  # 7d, how long applied offline event ids are remembered
+    PROGRESS_SYNC_MAX_CLOCK_SKEW: int = 300  # seconds a client timestamp may be ahead of the server
+    QUIZ_SCORE_HISTORY_SIZE: int = 10       # recent attempts kept in lessons[].quiz_scores
+    QUIZ_SCORE_MAX: int = 100
+    QUIZ_SCORE_BUCKET_WIDTH: int = 1        # histogram resolution, also the percentile error bound
+
+    # Lesson difficulty
+    LESSON_DIFFICULTY_TIME_SCALE: int = 900
+    LESSON_DIFFICULTY_TOP_K: int = 5
+    COURSE_OUTLINE_TTL: int = 3600
+
+    # Analytics compute pool
+    ANALYTICS_COMPUTE_WORKERS: int = 2
+    ANALYTICS_COMPUTE_MAX_PENDING: int = 32
+    ANALYTICS_COMPUTE_TIMEOUT: float = 30
+    ANALYTICS_COMPUTE_METRICS_WINDOW: int = 1000
+
+    # Report jobs
+    REPORT_JOB_TTL: int = 86400
+    REPORT_JOB_STALE_SECONDS: int = 300
+    REPORT_MAX_RANGE_DAYS: int = 1096
+    REPORT_BATCH_SIZE: int = 500
+    REPORT_QUEUE_POLL_SECONDS: int = 5
+    REPORT_PURGE_INTERVAL: int = 3600
+
+    # Columnar progress snapshots
+    SNAPSHOT_DIR: str = "snapshots"
+    SNAPSHOT_CHUNK_ROWS: int = 100000
+    SNAPSHOT_CURSOR_BATCH: int = 1000
+    SNAPSHOT_KEEP: int = 3
+
+    # Background cache warming
+    CACHE_WARM_INTERVAL: int = 300
+    CACHE_WARM_JITTER: float = 0.1          # +/- fraction applied to every sleep
+    CACHE_WARM_BUDGET_SECONDS: int = 60     # stop warming once a cycle has run this long
+    CACHE_WARM_LEASE_SECONDS: int = 600     # must exceed interval * (1 + jitter) + budget
+    CACHE_WARM_TOP_COURSES: int = 20
+    CACHE_WARM_TRAFFIC_WINDOW_HOURS: int = 24  # traffic counted per hour, ranked over this window
+
+    # Lesson heartbeats
+    HEARTBEAT_INTERVAL_SECONDS: int = 30   # client cadence, default increment per beat
+    HEARTBEAT_MAX_SECONDS: int = 120       # cap per beat so a stale tab can't inflate time
+    HEARTBEAT_FLUSH_INTERVAL: int = 60
+    HEARTBEAT_FLUSH_BATCH: int = 1000
+    HEARTBEAT_FLUSH_BUDGET_SECONDS: float = 50  # per cycle; keep below HEARTBEAT_FLUSH_INTERVAL
+
+    # Live push (SSE / WebSocket)
+    LIVE_QUEUE_SIZE: int = 100        # per-connection buffer, oldest messages dropped beyond this
+    LIVE_MAX_TOPICS: int = 20
+    LIVE_KEEPALIVE_SECONDS: int = 15
+
+    # Analytics
+    PLATFORM_TOP_COURSES: int = 10
+    COURSE_STATS_RECONCILE_INTERVAL: int = 3600
+
+    # Activity bitmaps
+    ACTIVITY_DAY_RETENTION_DAYS: int = 400
+    ACTIVITY_MAX_RANGE_DAYS: int = 366
+    ROLLUP_LEARNER_DEDUP_DAYS: int = 8  # never less than the offline sync window + 1 day
 
     class Config:
         env_file = ".env"
@@ -51,32 +163,3 @@ class Settings(BaseSettings):
 
 # Create settings instance
 settings = Settings()
-
-# ✅ MongoDB client
-mongo_client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_URI)
-db = mongo_client[settings.MONGO_DB]
-
-# ✅ Redis client
-redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-
-
-# Test Redis availability safely
-def test_redis_connection():
-    """Test Redis connection without blocking startup"""
-    try:
-        import asyncio
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(redis.ping())
-        return True
-    except Exception as e:
-        print(f"⚠️ Redis connection failed: {e}")
-        return False
-
-
-settings.REDIS_AVAILABLE = test_redis_connection()
-
-if settings.REDIS_AVAILABLE:
-    print("✅ Redis is available and connected")
-else:
-    print("⚠️ Redis not available - some features will be limited")
-    print("💡 Make sure Redis is running: redis-server")
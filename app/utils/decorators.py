@@ -1,10 +1,9 @@
 
-import json
-from functools import wraps
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
 import redis.asyncio as aioredis
 from app.utils.config import settings
+from app.utils.cache import cached
 
 # ------------------- JWT Access Token Verification -------------------
 async def verify_access_token(token: str, redis_client: aioredis.Redis):
@@ -28,23 +27,8 @@ async def verify_access_token(token: str, redis_client: aioredis.Redis):
 
 # ------------------- Redis Cache Decorator -------------------
 def redis_cache(redis_client: aioredis.Redis, key: str, ttl: int):
-
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            cached_data = await redis_client.get(key)
-            if cached_data:
-                try:
-                    return json.loads(cached_data)
-                except json.JSONDecodeError:
-                    pass  # fallback to calling function
-
-            result = await func(*args, **kwargs)
-            await redis_client.set(key, json.dumps(result), ex=ttl)
-            return result
-
-        return wrapper
-    return decorator
+    # Key templates, Settings TTLs, jitter and negative caching: see app.utils.cache.cached
+    return cached(key, ttl, redis_client=redis_client)
 
 
 # ------------------- Cache Invalidation -------------------
@@ -0,0 +1,246 @@
+# app/utils/redis_breaker.py
+"""
+Circuit breaker for Redis.
+
+Every command and pipeline sent through BreakerRedis (the client built in
+app/db.py) gets a tight timeout. After REDIS_BREAKER_FAILURES consecutive
+connection errors or timeouts the breaker opens: calls fail immediately with
+RedisUnavailable instead of waiting on sockets. After
+REDIS_BREAKER_RESET_SECONDS one trial call is let through (half-open); if it
+succeeds the breaker closes and deferred writes are replayed.
+
+Degraded mode:
+- cache reads through app.utils.codec count as misses, so data comes from
+  Mongo (or a local L1), and cache fills are skipped;
+- invalidations and important derived writes go through run_or_defer and are
+  replayed in order once Redis is back. A replay can follow an attempt that
+  did reach the server (e.g. a timed-out pipeline), so non-idempotent steps
+  (counters) run through apply_once under an op id and are applied only once;
+- anything else that needs Redis raises RedisUnavailable, which main.py
+  turns into a fast 503.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Blocking commands wait on the server by design; they rely on the socket timeout
+BLOCKING_COMMANDS = {"BLPOP", "BRPOP", "BRPOPLPUSH", "BLMOVE", "BLMPOP", "BZPOPMIN", "BZPOPMAX", "BZMPOP"}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Runs a batch of single-key commands atomically and remembers their replies
+# under the op's hash field, so a replay returns the first replies instead of
+# applying the commands again.
+# KEYS[1] op hash, KEYS[2..] one key per command; ARGV: ttl, step, then
+# name, argc, args... per command
+_APPLY_ONCE_SCRIPT = """
+local done = redis.call('hget', KEYS[1], ARGV[2])
+if done then
+    return cjson.decode(done)
+end
+local results, a = {}, 3
+for k = 2, #KEYS do
+    local argc = tonumber(ARGV[a + 1])
+    results[#results + 1] = redis.call(ARGV[a], KEYS[k], unpack(ARGV, a + 2, a + 1 + argc))
+    a = a + 2 + argc
+end
+redis.call('hset', KEYS[1], ARGV[2], cjson.encode(results))
+redis.call('expire', KEYS[1], ARGV[1])
+return results
+"""
+
+
+class RedisUnavailable(ConnectionError):
+    """Redis is down or the breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self.dropped = 0
+        self._trial_running = False
+        self._deferred = OrderedDict()  # dedupe key -> (func, args)
+        self._replay_task = None
+
+    # ---------- State ----------
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= settings.REDIS_BREAKER_RESET_SECONDS:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release_trial(self):
+        self._trial_running = False
+
+    def record_success(self):
+        self._trial_running = False
+        self.failures = 0
+        if self.state != CLOSED:
+            logger.warning("Redis circuit closed")
+            self.state = CLOSED
+            self._start_replay()
+
+    def record_failure(self):
+        self._trial_running = False
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= settings.REDIS_BREAKER_FAILURES):
+            if self.state == CLOSED:
+                self.trips += 1
+                logger.warning("Redis circuit opened after %d failures", self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    # ---------- Deferred writes ----------
+    def defer(self, func, *args, dedupe_key=None):
+        """
+        Queue `await func(*args)` for replay once Redis is back; the oldest
+        entry goes when full. Entries sharing a dedupe_key collapse into one.
+        """
+        key = dedupe_key if dedupe_key is not None else object()
+        self._deferred.pop(key, None)
+        self._deferred[key] = (func, args)
+        while len(self._deferred) > settings.REDIS_REPLAY_QUEUE_MAX:
+            self._deferred.popitem(last=False)
+            self.dropped += 1
+        if not self.is_open:
+            self._start_replay()
+
+    def _start_replay(self):
+        if self._deferred and (self._replay_task is None or self._replay_task.done()):
+            try:
+                self._replay_task = asyncio.get_running_loop().create_task(self.replay(), name="redis-replay")
+            except RuntimeError:
+                pass  # no loop; the next success in one will replay
+
+    async def replay(self):
+        replayed = 0
+        while self._deferred and not self.is_open:
+            key, (func, args) = next(iter(self._deferred.items()))
+            try:
+                await func(*args)
+            except (ConnectionError, TimeoutError):
+                break  # still failing; stays queued for the next close
+            except Exception:
+                logger.exception("Dropping deferred Redis write %s", getattr(func, "__qualname__", func))
+            self._deferred.pop(key, None)
+            replayed += 1
+        if replayed:
+            logger.info("Replayed %d deferred Redis writes, %d left", replayed, len(self._deferred))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.is_open else None,
+            "trips": self.trips,
+            "rejected_calls": self.rejected,
+            "deferred_writes": len(self._deferred),
+            "dropped_writes": self.dropped,
+        }
+
+
+async def _guarded(breaker: CircuitBreaker, call, timeout):
+    """`call` is a zero-argument coroutine factory, so nothing is created when the breaker rejects."""
+    if not breaker.allow():
+        raise RedisUnavailable("Redis circuit is open")
+    try:
+        result = await (asyncio.wait_for(call(), timeout) if timeout else call())
+    except asyncio.TimeoutError as e:
+        breaker.record_failure()
+        raise RedisUnavailable(f"Redis call timed out after {timeout}s") from e
+    except (ConnectionError, TimeoutError):
+        breaker.record_failure()
+        raise
+    except BaseException:
+        # Server-side errors (WRONGTYPE, script errors...) and cancellation say nothing about availability
+        breaker.release_trial()
+        raise
+    breaker.record_success()
+    return result
+
+
+class BreakerPipeline(Pipeline):
+    breaker: CircuitBreaker = None
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.command_stack:
+            return await super().execute(raise_on_error)
+        return await _guarded(
+            self.breaker, lambda: super(BreakerPipeline, self).execute(raise_on_error), settings.REDIS_PIPELINE_TIMEOUT
+        )
+
+
+class BreakerRedis(aioredis.Redis):
+    breaker: CircuitBreaker = None
+
+    async def execute_command(self, *args, **options):
+        timeout = None if str(args[0]).upper() in BLOCKING_COMMANDS else settings.REDIS_COMMAND_TIMEOUT
+        return await _guarded(
+            self.breaker, lambda: super(BreakerRedis, self).execute_command(*args, **options), timeout
+        )
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> BreakerPipeline:
+        pipe = BreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+
+async def run_or_defer(func, *args, dedupe_key=None):
+    """Run a Redis write now, or queue it for replay if Redis is unavailable."""
+    try:
+        return await func(*args)
+    except (ConnectionError, TimeoutError):
+        redis_breaker.defer(func, *args, dedupe_key=dedupe_key)
+
+
+async def invalidate(redis_client, *keys):
+    """Delete cache keys now, or as soon as Redis is back."""
+    if keys:
+        await run_or_defer(redis_client.delete, *keys, dedupe_key=("DEL",) + tuple(sorted(keys)))
+
+
+def op_key(op_id: str) -> str:
+    return f"redis_ops:{op_id}"
+
+
+async def apply_once(redis_client, op_id: str, step: str, commands) -> list:
+    """
+    Run (command, key, *args) tuples atomically, once per (op_id, step); a
+    replay returns the replies of the first run. Commands must reply with
+    integers or strings.
+    """
+    commands = list(commands)
+    if not commands:
+        return []
+    argv = [settings.REDIS_REPLAY_OP_TTL, step]
+    for name, _, *args in commands:
+        argv.extend((name, len(args), *args))
+    keys = [op_key(op_id)] + [key for _, key, *_ in commands]
+    return await redis_client.eval(_APPLY_ONCE_SCRIPT, len(keys), *keys, *argv)
+
+
+# One breaker per worker, shared by the app's Redis client
+redis_breaker = CircuitBreaker()
@@ -0,0 +1,129 @@
+# app/utils/startup.py
+"""
+Startup timing and readiness.
+
+Importing this module (first thing in main.py) installs an import timer that
+records how long each app module and each top-level package took to import,
+including whatever it imported in turn. main.lifespan then waits for the
+backing services to answer a ping for at most STARTUP_DEADLINE_SECONDS and
+starts serving either way; if they aren't ready by then, probing continues
+in the background and readiness is reported on /health/ready.
+
+Stdlib only, so importing it costs nothing worth measuring.
+"""
+
+import asyncio
+import importlib.abc
+import importlib.machinery
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+_T0 = time.perf_counter()
+_FILE_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+
+
+def _since_start_ms(at: float = None) -> float:
+    return round(((time.perf_counter() if at is None else at) - _T0) * 1000, 1)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Times exec_module of app.* modules and top-level packages found by the finders after it."""
+
+    def __init__(self):
+        self.times = {}
+
+    def find_spec(self, name, path=None, target=None):
+        if "." in name and not name.startswith("app."):
+            return None
+        finders = sys.meta_path[sys.meta_path.index(self) + 1:]
+        for finder in finders:
+            find_spec = getattr(finder, "find_spec", None)
+            spec = find_spec(name, path, target) if find_spec else None
+            if spec is not None:
+                break
+        else:
+            return None
+        # Only file loaders: they are created per module, so patching the instance is safe
+        if isinstance(spec.loader, _FILE_LOADERS):
+            spec.loader.exec_module = self._timed(name, spec.loader.exec_module)
+        return spec
+
+    def _timed(self, name, exec_module):
+        def timed_exec_module(module):
+            started = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                self.times[name] = time.perf_counter() - started
+        return timed_exec_module
+
+
+class StartupReport:
+    def __init__(self):
+        self._timer = _ImportTimer()
+        self.lifespan_started_at = None
+        self.ready_at = None
+        self.checks = {}
+        self.ready = asyncio.Event()
+
+    def install(self):
+        if self._timer not in sys.meta_path:
+            sys.meta_path.insert(0, self._timer)
+
+    def lifespan_started(self):
+        """Imports are done once the app is starting; later lazy imports aren't timed."""
+        if self._timer in sys.meta_path:
+            sys.meta_path.remove(self._timer)
+        self.lifespan_started_at = time.perf_counter()
+
+    def _record(self, checks: dict) -> bool:
+        self.checks = checks
+        ok = all(check["ok"] for check in checks.values())
+        if ok and not self.ready.is_set():
+            self.ready_at = time.perf_counter()
+            self.ready.set()
+        return ok
+
+    async def wait_until_ready(self, probe, deadline: float, interval: float, timeout: float) -> bool:
+        """Probe until everything answers or `deadline` seconds pass; never raises."""
+        give_up_at = time.monotonic() + deadline
+        while True:
+            remaining = give_up_at - time.monotonic()
+            if self._record(await probe(max(0.1, min(timeout, remaining)))):
+                return True
+            if remaining <= interval:
+                return False
+            await asyncio.sleep(interval)
+
+    async def keep_probing(self, probe, interval: float, timeout: float):
+        """Background follow-up after a missed deadline, until the first success."""
+        while not self.ready.is_set():
+            await asyncio.sleep(interval)
+            try:
+                self._record(await probe(timeout))
+            except Exception:
+                logger.exception("Readiness probe failed")
+
+    def summary(self, slowest: int = 15) -> dict:
+        imports = sorted(self._timer.times.items(), key=lambda item: item[1], reverse=True)
+        started = self.lifespan_started_at
+        return {
+            # Inclusive times: a package's figure includes the modules it imported first
+            "imports": [{"module": name, "ms": round(seconds * 1000, 1)} for name, seconds in imports[:slowest]],
+            "lifespan_started_ms": _since_start_ms(started) if started else None,
+            "ready": self.ready.is_set(),
+            "time_to_ready_ms": _since_start_ms(self.ready_at) if self.ready_at else None,
+            "ready_after_lifespan_ms": round((self.ready_at - started) * 1000, 1) if self.ready_at and started else None,
+            "checks": self.checks,
+        }
+
+
+startup_report = StartupReport()
+startup_report.install()
@@ -1,4 +1,4 @@
-
+from app.utils.startup import startup_report  # first import: times the imports below
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -68,23 +68,90 @@ if __name__ == "__main__":
 
 
 # main.py
+import asyncio
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer
 from fastapi.openapi.models import HTTPBearer as HTTPBearerModel
 from fastapi.openapi.utils import get_openapi
 
-from app.routes import auth, course, analytics, progress, cache, test_redis
+from app.routes import auth, course, analytics, progress, cache, live, test_redis
+from app.db import resources
 from app.dependencies import close_connections
+from app.services.heartbeat_service import HeartbeatService
+from app.services.live_service import live_hub
+from app.services.course_stats_service import CourseStatsService
+from app.services.cache_warmer import CacheWarmer
+from app.services.rollup_service import RollupService
+from app.services.report_service import ReportService
+from app.utils.background import start_background, stop_background
+from app.utils.compute import compute_executor
+from app.utils.cache_stats import cache_stats
+from app.utils.config import settings
+from app.utils.startup import startup_report
+from app.utils.redis_breaker import redis_breaker
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+
+async def ensure_indexes(db, redis_client):
+    # Needs Mongo, so it waits for readiness instead of blocking (or failing) startup
+    await startup_report.ready.wait()
+    try:
+        await RollupService(db, redis_client).ensure_indexes()
+    except Exception as e:
+        print(f"⚠️ Index creation failed: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting E-Learning API...")
+    startup_report.lifespan_started()
+    resources.open()
+    db, redis_client = resources.db, resources.redis
+    ready = await startup_report.wait_until_ready(
+        resources.probe, settings.STARTUP_DEADLINE_SECONDS,
+        settings.STARTUP_PROBE_INTERVAL, settings.READINESS_PROBE_TIMEOUT
+    )
+    settings.REDIS_AVAILABLE = startup_report.checks["redis"]["ok"]
+    report = startup_report.summary(slowest=5)
+    slowest = ", ".join(f"{i['module']} {i['ms']} ms" for i in report["imports"])
+    if ready:
+        print(f"✅ Ready after {report['time_to_ready_ms']} ms (imports done at {report['lifespan_started_ms']} ms)")
+    else:
+        print(f"⚠️ Backends not ready after {settings.STARTUP_DEADLINE_SECONDS}s, serving anyway: {report['checks']}")
+    print(f"Slowest imports: {slowest}")
+
+    heartbeats = HeartbeatService(db, redis_client)
+    reports = ReportService(db, redis_client)
+    background_tasks = [
+        asyncio.create_task(ensure_indexes(db, redis_client), name="ensure-indexes"),
+        start_background("heartbeat-flush", settings.HEARTBEAT_FLUSH_INTERVAL, heartbeats.flush),
+        start_background("course-stats-reconcile", settings.COURSE_STATS_RECONCILE_INTERVAL,
+                         CourseStatsService(db).scheduled_reconcile, redis_client),
+        asyncio.create_task(CacheWarmer(db, redis_client).run(), name="cache-warmer"),
+        asyncio.create_task(reports.run_worker(), name="report-worker"),
+        start_background("report-purge", settings.REPORT_PURGE_INTERVAL, reports.purge_expired),
+        start_background("cache-stats-flush", settings.CACHE_STATS_FLUSH_INTERVAL, cache_stats.flush, redis_client),
+    ]
+    if not ready:
+        background_tasks.append(asyncio.create_task(startup_report.keep_probing(
+            resources.probe, settings.STARTUP_PROBE_INTERVAL, settings.READINESS_PROBE_TIMEOUT
+        ), name="readiness-probe"))
+    if settings.CACHE_TRACK_EVICTIONS:
+        background_tasks.append(asyncio.create_task(cache_stats.track_evictions(redis_client), name="cache-evictions"))
     yield
     # Shutdown
     print("Shutting down E-Learning API...")
+    await stop_background(background_tasks)
+    try:
+        await cache_stats.flush(redis_client)
+    except Exception:
+        pass
+    await live_hub.close()
+    compute_executor.shutdown()
     await close_connections()
 
 # Create FastAPI app with lifespan management
@@ -98,12 +165,25 @@ app = FastAPI(
 # Add JWT security
 security = HTTPBearer()
 
+
+# Features that can't work without Redis fail fast (503) while it is unavailable;
+# includes RedisUnavailable raised by the open circuit breaker
+@app.exception_handler(RedisConnectionError)
+@app.exception_handler(RedisTimeoutError)
+async def redis_unavailable_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Temporarily unavailable, please retry"},
+        headers={"Retry-After": str(int(settings.REDIS_BREAKER_RESET_SECONDS))},
+    )
+
 # Include routers with prefixes
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(course.router, prefix="/courses", tags=["Courses"])
 # app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 app.include_router(progress.router, prefix="/progress", tags=["Progress"])
 app.include_router(cache.router, prefix="/cache", tags=["Cache"])
+app.include_router(live.router, prefix="/live", tags=["Live"])
 # from app.routes.test_redis import router as test_redis_router
 # app.include_router(test_redis_router, tags=["Test"])
 from app.routes import analytics
@@ -158,11 +238,38 @@ def root():
 @app.get("/health", tags=["Health"])
 async def health_check():
     return {
-        "status": "healthy",
+        "status": "degraded" if redis_breaker.is_open else "healthy",
         "message": "E-Learning API is running",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "redis_breaker": redis_breaker.stats(),
     }
 
 
+# Liveness: the process is up and serving (no backend checks)
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    return {"status": "alive"}
+
+
+# Readiness: Mongo and Redis answer a ping right now
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    checks = await resources.probe(settings.READINESS_PROBE_TIMEOUT)
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "checks": checks})
+
+
+# Import times per module and time to first ready for this worker
+@app.get("/health/startup", tags=["Health"])
+async def startup_stats():
+    return startup_report.summary()
+
+
+# Connection pool utilisation and checkout wait times for this worker
+@app.get("/health/pools", tags=["Health"])
+async def pool_stats():
+    return resources.stats()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)